@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH", "ai_cache.db")
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "20000"))
+
+
+def make_cache_key(model: str, prompt: str, system_instruction: str, is_json: bool = False) -> str:
+    """Content address of a Gemini request: identical inputs always map to the same key."""
+    h = hashlib.sha256()
+    for part in (model, system_instruction, prompt, "json" if is_json else "text"):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class AICache:
+    """
+    Local SQLite cache for Gemini responses.
+
+    Entries expire after ttl_seconds; once max_entries is exceeded the least recently
+    used entries are evicted. Hit/miss counters are kept for the lifetime of the process.
+    """
+    def __init__(self, path: str = AI_CACHE_PATH, ttl_seconds: int = AI_CACHE_TTL_SECONDS,
+                 max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ai_cache_accessed ON ai_cache (accessed_at);
+            """
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                self._conn.execute("UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                return row[0]
+            if row:
+                self._conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._size -= 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO ai_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if cur.rowcount == 0:
+                self._conn.execute(
+                    "UPDATE ai_cache SET value = ?, created_at = ?, accessed_at = ? WHERE key = ?",
+                    (value, now, now, key),
+                )
+            else:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict_locked(now)
+            self._conn.commit()
+
+    def _evict_locked(self, now: float) -> None:
+        # Expired entries go first, then the least recently used ones
+        cur = self._conn.execute("DELETE FROM ai_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        removed = cur.rowcount
+        overflow = self._size - removed - self.max_entries
+        if overflow > 0:
+            cur = self._conn.execute(
+                "DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            removed += cur.rowcount
+        self._size -= removed
+        self.evictions += removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self._size,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from telethon.errors import FloodWaitError
+
+import main
+
+BACKFILL_PAGE_SIZE = int(os.getenv('BACKFILL_PAGE_SIZE', '500'))  # Messages fetched per iter_messages page
+BACKFILL_MAX_PENDING = int(os.getenv('BACKFILL_MAX_PENDING', '200'))  # Crawling pauses while this many jobs wait
+BACKFILL_REPORT_SECONDS = 15
+
+# Backfill keeps its own checkpoint and open group, so it never moves the live checkpoint
+CHECKPOINT_PREFIX = "backfill:"
+
+
+class BackfillProgress:
+    """Per-channel throughput and ETA, estimated from how far the message ids have advanced."""
+    def __init__(self, channel: str, start_id: int, latest_id: int):
+        self.channel = channel
+        self.start_id = start_id
+        self.latest_id = latest_id
+        self.current_id = start_id
+        self.messages = 0
+        self.groups = 0
+        self.started = time.monotonic()
+        self.reported = 0.0
+
+    def update(self, last_id: int, messages: int, groups: int) -> None:
+        self.current_id = last_id
+        self.messages += messages
+        self.groups += groups
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.messages / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        elapsed = time.monotonic() - self.started
+        advanced = self.current_id - self.start_id
+        if advanced <= 0 or elapsed <= 0:
+            return None
+        return max(0, self.latest_id - self.current_id) / (advanced / elapsed)
+
+    def report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self.reported < BACKFILL_REPORT_SECONDS:
+            return
+        self.reported = now
+        eta = self.eta_seconds()
+        eta_text = "unknown" if eta is None else f"{int(eta // 60)}m{int(eta % 60):02d}s"
+        print(f"    [BACKFILL] {self.channel}: {self.messages} msgs, {self.groups} groups queued, "
+              f"{self.rate():.1f} msg/s, at id {self.current_id}/{self.latest_id}, ETA {eta_text}")
+
+
+async def wait_for_queue_capacity():
+    """Backpressure: lets the stage workers catch up before fetching more history."""
+    while main.queue.pending() >= BACKFILL_MAX_PENDING:
+        await asyncio.sleep(2)
+
+
+async def backfill_channel(config, since: datetime, page_size: int = BACKFILL_PAGE_SIZE):
+    """
+    Crawls one channel's history from `since` up to its newest message, oldest first.
+    Every page is grouped and queued before its checkpoint is committed, so an
+    interrupted run resumes from the last completed page.
+    """
+    target_channel = config['channel_username']
+    key = CHECKPOINT_PREFIX + target_channel
+    channel = await main.get_channel_entity(target_channel)
+
+    latest = await main.client.get_messages(channel, limit=1)
+    latest_id = latest[0].id if latest else 0
+    last_id = main.state.get_last_message_id(key)
+    progress = BackfillProgress(target_channel, last_id or 0, latest_id)
+    if last_id is not None:
+        print(f"    [BACKFILL] {target_channel}: resuming after message {last_id}")
+
+    while True:
+        await wait_for_queue_capacity()
+        await main.wait_for_flood_gate()
+        try:
+            if last_id is None:
+                history = main.client.iter_messages(channel, offset_date=since, reverse=True, limit=page_size)
+            else:
+                history = main.client.iter_messages(channel, min_id=last_id, reverse=True, limit=page_size)
+            msgs = [m async for m in history]
+        except FloodWaitError as e:
+            main.note_flood_wait(e.seconds)
+            print(f"  [Flood wait on {target_channel}] {e.seconds}s")
+            continue
+
+        if not msgs:
+            break
+        if last_id is None:
+            progress.start_id = progress.current_id = msgs[0].id - 1
+
+        groups, open_group = main.grouper.feed(key, msgs, at_head=False)  # The trailing group is closed below
+        queued = main.enqueue_groups(config, groups, {m.id: m for m in msgs})
+        main.grouper.save(key, open_group)
+        last_id = msgs[-1].id
+        main.state.set_last_message_id(key, last_id)
+
+        progress.update(last_id, len(msgs), queued)
+        progress.report()
+
+        if len(msgs) < page_size:
+            break
+
+    # The newest group cannot grow any further within this run
+    open_group = main.grouper.open_group(key)
+    if open_group:
+        progress.update(last_id, 0, main.enqueue_groups(config, [open_group]))
+        main.grouper.save(key, None)
+
+    progress.report(force=True)
+    return progress
+
+
+async def run_backfill(configs, since: datetime, page_size: int = BACKFILL_PAGE_SIZE):
+    """Backfills channels concurrently, then waits for the queued work to drain."""
+    pipeline = main.start_pipeline()
+    semaphore = asyncio.Semaphore(main.CHANNEL_CONCURRENCY)
+    started = time.monotonic()
+
+    async def run_one(config):
+        async with semaphore:
+            return await backfill_channel(config, since, page_size)
+
+    results = await asyncio.gather(*(run_one(c) for c in configs), return_exceptions=True)
+    messages = 0
+    for config, res in zip(configs, results):
+        if isinstance(res, Exception):
+            print(f"  [Error backfilling {config['channel_username']}] {res}")
+        else:
+            messages += res.messages
+
+    while main.queue.pending():
+        print(f"Waiting for the pipeline to drain: {main.queue.counts()}")
+        await asyncio.sleep(BACKFILL_REPORT_SECONDS)
+
+    elapsed = time.monotonic() - started
+    print(f"Backfill complete: {messages} messages in {int(elapsed)}s "
+          f"({messages / elapsed if elapsed else 0:.1f} msg/s). Work queue: {main.queue.counts()}")
+    for task in pipeline:
+        task.cancel()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill channel history into the post pipeline.")
+    parser.add_argument("--since", required=True, help="Start date, e.g. 2024-01-01")
+    parser.add_argument("--channel", action="append",
+                        help="channel_username to backfill (repeatable); defaults to every configured channel")
+    parser.add_argument("--page-size", type=int, default=BACKFILL_PAGE_SIZE)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main.setup()
+    since = datetime.fromisoformat(args.since)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    configs = [c for c in main.CHANNELS_CONFIG if not args.channel or c['channel_username'] in args.channel]
+    with main.client: main.client.loop.run_until_complete(run_backfill(configs, since, args.page_size))
@@ -0,0 +1,324 @@
+"""
+Offline stand-ins for the scraper's external services, used by the benchmarks.
+
+- generate_channel(): Telethon-like messages (captions, albums, Amharic text, reposted photos)
+- FakeTelegramClient: the subset of TelegramClient the scraper calls
+- FakeServices: local HTTP servers for Gemini generateContent, the Bunny upload route and the post API
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from PIL import Image, ImageDraw
+from telethon.tl import types
+
+ENGLISH_SENTENCES = [
+    "Ethiopia's coffee export earnings rose in the last quarter on stronger demand from Europe.",
+    "The authority met exporters to discuss new quality certification for oilseeds and pulses.",
+    "A new logistics corridor through Djibouti is expected to cut transit times for exporters.",
+    "Livestock exports to the Gulf resumed after the veterinary inspection agreement was renewed.",
+    "The ministry announced training for cooperatives on post-harvest handling of sesame.",
+    "Tea and spice exporters were invited to an international trade fair in Dubai next month.",
+    "The board reviewed the annual performance report and approved the new strategic plan.",
+    "Staff celebrated the national holiday with a cultural program at the head office.",
+]
+AMHARIC_SENTENCES = [
+    "የኢትዮጵያ ቡና የወጪ ንግድ ገቢ ባለፈው ሩብ ዓመት ጨምሯል።",
+    "ባለስልጣኑ ከላኪዎች ጋር በጥራት ማረጋገጫ ዙሪያ ተወያይቷል።",
+    "አዲሱ የሎጂስቲክስ መስመር የማጓጓዣ ጊዜን ያሳጥራል ተብሎ ይጠበቃል።",
+    "የቁም እንስሳት የወጪ ንግድ እንደገና ተጀምሯል።",
+    "ሚኒስቴሩ ለህብረት ሥራ ማህበራት ስልጠና መስጠቱን አስታውቋል።",
+]
+
+
+# --- Synthetic Telegram messages ---
+
+class FakeFile:
+    def __init__(self, ext: str, size: int):
+        self.ext = ext
+        self.size = size
+
+
+class FakeMessage:
+    """Carries the attributes the scraper reads from telethon Message objects."""
+    def __init__(self, msg_id: int, date: datetime, text: str = "", photo=None, image: Optional[bytes] = None,
+                 grouped_id: Optional[int] = None, download_latency: float = 0.0):
+        self.id = msg_id
+        self.date = date
+        self.message = text
+        self.photo = photo
+        self.document = None
+        self.grouped_id = grouped_id
+        self.file = FakeFile(".jpg", len(image)) if image else None
+        self._image = image
+        self._download_latency = download_latency
+
+    async def download_media(self, file=None, thumb=None):
+        if self._image is None:
+            return None
+        if thumb is not None and self.photo is not None:
+            # Mirrors TelegramClient._get_thumb: type strings resolve, other objects than these are ignored
+            if isinstance(thumb, str):
+                thumb = next((s for s in self.photo.sizes if s.type == thumb), None)
+            elif not isinstance(thumb, (types.PhotoSize, types.PhotoCachedSize, types.PhotoStrippedSize)):
+                thumb = None
+            if thumb is None:
+                return None
+        await asyncio.sleep(self._download_latency)
+        if file is bytes:
+            return self._image
+        path = f"{file}.jpg"
+        with open(path, "wb") as f:
+            f.write(self._image)
+        return path
+
+
+def make_images(count: int, seed: int, side: int = 1600) -> List[bytes]:
+    """Distinct photo-like JPEGs (gradients plus shapes), reproducible from the seed."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.new("RGB", (side, side * 3 // 4))
+        draw = ImageDraw.Draw(img)
+        c1 = [rng.randrange(256) for _ in range(3)]
+        c2 = [rng.randrange(256) for _ in range(3)]
+        for y in range(img.height):
+            t = y / img.height
+            draw.line([(0, y), (img.width, y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(c1, c2)))
+        for _ in range(40):
+            x, y = rng.randrange(img.width), rng.randrange(img.height)
+            r = rng.randrange(20, 200)
+            draw.ellipse([x, y, x + r, y + r], fill=tuple(rng.randrange(256) for _ in range(3)))
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=90)
+        images.append(buf.getvalue())
+    return images
+
+
+def _photo(photo_id: int, data: bytes):
+    sizes = [
+        types.PhotoSize(type="m", w=320, h=240, size=len(data) // 12),
+        types.PhotoSize(type="x", w=800, h=600, size=len(data) // 3),
+        # Telegram sends the large sizes as progressive JPEGs
+        types.PhotoSizeProgressive(type="y", w=1280, h=960, sizes=[len(data) // 8, len(data) // 2, len(data)]),
+        types.PhotoSizeProgressive(type="w", w=2560, h=1920, sizes=[len(data) // 4, len(data) * 2, len(data) * 4]),
+    ]
+    return types.Photo(id=photo_id, access_hash=0, file_reference=b"", date=None, sizes=sizes, dc_id=1)
+
+
+def _caption(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(2, 5)):
+        pool = AMHARIC_SENTENCES if rng.random() < 0.5 else ENGLISH_SENTENCES
+        paragraphs.append(" ".join(rng.sample(pool, rng.randint(1, 3))))
+    return "\n".join(paragraphs)
+
+
+def generate_channel(posts: int, seed: int = 1, images: Optional[List[bytes]] = None, album_rate: float = 0.4,
+                     photo_rate: float = 0.3, noise_rate: float = 0.1, repost_rate: float = 0.1,
+                     download_latency: float = 0.0) -> List[FakeMessage]:
+    """
+    Oldest-first messages for one channel: each post is a caption, optionally followed by
+    an album (shared grouped_id) or loose photos within a minute. Posts are ten minutes
+    apart and all lie in the past, so every group is closed by the time it is fetched.
+    """
+    rng = random.Random(seed)
+    images = images or make_images(8, seed)
+    start = datetime.now(timezone.utc) - timedelta(minutes=10 * posts + 60)
+    msgs: List[FakeMessage] = []
+    photo_ids = []
+    next_id = 1
+
+    def add(offset_seconds, **kwargs):
+        nonlocal next_id
+        msgs.append(FakeMessage(next_id, date + timedelta(seconds=offset_seconds), download_latency=download_latency,
+                                **kwargs))
+        next_id += 1
+
+    def photo_kwargs():
+        if photo_ids and rng.random() < repost_rate:
+            photo_id, data = rng.choice(photo_ids)  # Same Telegram file reposted
+        else:
+            photo_id, data = seed * 1_000_000 + len(photo_ids) + 1, rng.choice(images)
+            photo_ids.append((photo_id, data))
+        return {"photo": _photo(photo_id, data), "image": data}
+
+    for n in range(posts):
+        date = start + timedelta(minutes=10 * n)
+        roll = rng.random()
+        if roll < noise_rate:
+            add(0, text=rng.choice(["👍", "Happy holiday!", "Stay tuned."]))
+        elif roll < noise_rate + album_rate:
+            grouped_id = seed * 1_000_000 + n
+            for k in range(rng.randint(2, 6)):
+                add(k, text=_caption(rng) if k == 0 else "", grouped_id=grouped_id, **photo_kwargs())
+        elif roll < noise_rate + album_rate + photo_rate:
+            add(0, text=_caption(rng))
+            for k in range(rng.randint(1, 2)):
+                add(20 + 20 * k, **photo_kwargs())
+        else:
+            add(0, text=_caption(rng))
+    return msgs
+
+
+class FakeTelegramClient:
+    """Serves generated messages through the TelegramClient calls the scraper makes."""
+    def __init__(self, channels: Dict[str, List[FakeMessage]], latency: float = 0.0):
+        self.channels = channels
+        self.latency = latency
+        self.requests = 0
+
+    async def _rtt(self):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+    async def get_entity(self, username):
+        await self._rtt()
+        return username
+
+    async def get_messages(self, entity, limit=None, ids=None):
+        await self._rtt()
+        msgs = self.channels[entity]
+        if ids is not None:
+            by_id = {m.id: m for m in msgs}
+            return [by_id.get(i) for i in ids]
+        return list(reversed(msgs))[:limit]
+
+    def iter_messages(self, entity, limit=None, min_id=0, offset_date=None, reverse=False):
+        msgs = self.channels[entity]
+        selected = [m for m in msgs if m.id > (min_id or 0) and (offset_date is None or m.date > offset_date)]
+        if not reverse:
+            selected.reverse()
+        selected = selected[:limit]
+
+        async def pages():
+            for i, m in enumerate(selected):
+                if i % 100 == 0:
+                    await self._rtt()  # One request per 100-message page, like Telegram
+                yield m
+        return pages()
+
+
+# --- Local HTTP stand-ins ---
+
+class ServiceConfig:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+
+
+def _gemini_answer(text: str, rng: random.Random) -> str:
+    """A well-formed answer for each prompt the scraper sends."""
+    system, _, payload = text.partition("\n\nInput")
+    payload = payload.split(":\n", 1)[-1]
+    if "Respond with ONLY 'YES' or 'NO'" in system:
+        return "YES" if rng.random() < 0.7 else "NO"
+    if "Generate a short title" in system:
+        return json.dumps({"title": "የቡና የወጪ ንግድ", "otherTitle": "Coffee exports rise"}, ensure_ascii=False)
+    if "JSON array of posts" in system:
+        posts = json.loads(payload)
+        return json.dumps([{
+            "relevant": rng.random() < 0.7,
+            "title": "የቡና የወጪ ንግድ",
+            "otherTitle": "Coffee exports rise",
+            "translations": [f"Translated: {p[:40]}" if any("ሀ" <= ch <= "፿" for ch in p) else None
+                             for p in post["paragraphs"]],
+        } for post in posts], ensure_ascii=False)
+    if "translator" in system:
+        paragraphs = json.loads(payload)
+        return json.dumps([f"Translated: {p[:40]}" if any("ሀ" <= ch <= "፿" for ch in p) else None
+                           for p in paragraphs])
+    return "OK"
+
+
+class FakeServices:
+    """
+    Runs Gemini, Bunny upload and post API stand-ins on one local port, each with its
+    own latency and error rate (errors are 503s, which the scraper retries).
+    """
+    def __init__(self, gemini: ServiceConfig, bunny: ServiceConfig, api: ServiceConfig, seed: int = 1):
+        self.configs = {"gemini": gemini, "bunny": bunny, "api": api}
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counts = {name: 0 for name in self.configs}
+        self.errors = {name: 0 for name in self.configs}
+        self.bytes_received = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point the scraper at these stand-ins."""
+        return {
+            "GEMINI_BASE_URL": f"{self.base_url}/gemini",
+            "GEMINI_API_KEY": "bench",
+            "BUNNY_UPLOAD_ENDPOINT": f"{self.base_url}/bunny",
+            "API_BASE_URL": f"{self.base_url}/api/posts/[id]",
+        }
+
+    def start(self) -> "FakeServices":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _roll(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def _handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                name = self.path.strip("/").split("/", 1)[0]
+                config = services.configs.get(name)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if config is None:
+                    self._respond(404, b"{}")
+                    return
+                services.counts[name] += 1
+                services.bytes_received += len(body)
+                time.sleep(config.latency)
+                if services._roll() < config.error_rate:
+                    services.errors[name] += 1
+                    self._respond(503, b'{"error": "unavailable"}')
+                    return
+
+                if name == "gemini":
+                    text = json.loads(body)["contents"][0]["parts"][0]["text"]
+                    with services.rng_lock:
+                        answer = _gemini_answer(text, services.rng)
+                    reply = {"candidates": [{"content": {"parts": [{"text": answer}]}}]}
+                    self._respond(200, json.dumps(reply).encode("utf-8"))
+                else:
+                    self._respond(200, b'{"ok": true}')
+
+            do_POST = _handle
+            do_PUT = _handle
+
+        return Handler
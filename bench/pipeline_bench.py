@@ -0,0 +1,233 @@
+"""
+End-to-end pipeline benchmark against local stand-ins (no Telegram, Gemini or Bunny credentials).
+
+    python bench/pipeline_bench.py --posts 300 --channels 2 --gemini-latency 0.2 --output bench/results/base.json
+    python bench/pipeline_bench.py --posts 300 --channels 2 --gemini-latency 0.2 --compare bench/results/base.json
+
+Drives process_batch for every channel until its history is consumed, lets the work
+queue's stage workers enrich, upload and publish everything, then reports throughput,
+per-stage latency percentiles and peak memory. Message generation and service behaviour
+are seeded, and all state lives in a fresh temporary directory, so runs with the same
+arguments are comparable.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeServices, FakeTelegramClient, ServiceConfig, generate_channel, make_images  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200, help="Posts generated per channel")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="Seconds per Telegram request")
+    parser.add_argument("--download-latency", type=float, default=0.05, help="Seconds per media download")
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--bunny-latency", type=float, default=0.05)
+    parser.add_argument("--bunny-error-rate", type=float, default=0.0)
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--ai-mode", choices=("separate", "combined"), default=None,
+                        help="Overrides AI_MODE for this run")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Previous results JSON to print deltas against")
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(args, services, workdir):
+    """Points every store at the temp dir and every service at the stand-ins; must run before importing main."""
+    env = {
+        **services.env(),
+        "API_ID": "1",
+        "API_HASH": "bench",
+        "SESSION_NAME": os.path.join(workdir, "bench"),
+        "STATE_DB_PATH": os.path.join(workdir, "state.db"),
+        "WORK_QUEUE_PATH": os.path.join(workdir, "work_queue.db"),
+        "AI_CACHE_PATH": os.path.join(workdir, "ai_cache.db"),
+        "RELEVANCE_DB_PATH": os.path.join(workdir, "relevance.db"),
+        "MEDIA_INDEX_PATH": os.path.join(workdir, "media_index.db"),
+        "NEAR_DUP_PATH": os.path.join(workdir, "near_duplicates.db"),
+        "SLUG_INDEX_PATH": os.path.join(workdir, "slug_index.db"),
+        "WORK_QUEUE_IDLE_SECONDS": "0.05",
+        "METRICS_PORT": "0",
+    }
+    os.environ.update(env)
+    # Production throttles would dominate the measurement; still overridable from the shell
+    os.environ.setdefault("GEMINI_RPM", "100000")
+    os.environ.setdefault("GEMINI_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("GEMINI_BACKOFF_MAX", "1")
+    if args.ai_mode:
+        os.environ["AI_MODE"] = args.ai_mode
+
+
+async def run_pipeline(main, channels):
+    """Fetches every channel to the end through process_batch, then waits for the queue to drain."""
+    for config in main.CHANNELS_CONFIG:
+        main.state.set_last_message_id(config['channel_username'], 0)  # Whole synthetic history, not the lookback
+
+    pipeline = main.start_pipeline()
+    fetch_started = time.perf_counter()
+    remaining = list(main.CHANNELS_CONFIG)
+    while remaining:
+        before = {c['channel_username']: main.state.get_last_message_id(c['channel_username']) for c in remaining}
+        await asyncio.gather(*(main.process_batch(config) for config in remaining))
+        remaining = [c for c in remaining
+                     if before[c['channel_username']] < main.state.get_last_message_id(c['channel_username'])
+                     < channels[c['channel_username']][-1].id]
+    fetch_seconds = time.perf_counter() - fetch_started
+
+    while main.queue.pending():
+        await asyncio.sleep(0.05)
+    for task in pipeline:
+        task.cancel()
+    return fetch_seconds
+
+
+def summarize(args, samples, elapsed, fetch_seconds, channels, services, main, metrics, peak_traced):
+    messages = sum(len(msgs) for msgs in channels.values())
+    published = sum(v for _, v in metrics.POSTS_PUBLISHED._values.items())
+    stages = {}
+    for stage, values in sorted(samples.items()):
+        stages[stage] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(max(values) * 1000, 2),
+        }
+    return {
+        "revision": git_revision(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "ai_mode": main.AI_MODE,
+        "messages": messages,
+        "posts_published": published,
+        "elapsed_seconds": round(elapsed, 3),
+        "fetch_seconds": round(fetch_seconds, 3),
+        "messages_per_second": round(messages / elapsed, 2),
+        "posts_per_second": round(published / elapsed, 2),
+        "stages": stages,
+        "work_queue": main.queue.counts(),
+        "service_requests": services.counts,
+        "service_errors": services.errors,
+        "bytes_uploaded": int(metrics.BYTES_UPLOADED.value()),
+        "peak_traced_mb": round(peak_traced / 1024 / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def print_report(result, baseline=None):
+    def delta(key, value):
+        if not baseline or baseline.get(key) in (None, 0):
+            return ""
+        return f" ({(value - baseline[key]) / baseline[key] * 100:+.1f}%)"
+
+    print(f"\nRevision {result['revision']} | AI mode {result['ai_mode']} | {result['messages']} messages")
+    for key in ("elapsed_seconds", "fetch_seconds", "messages_per_second", "posts_per_second",
+                "peak_traced_mb", "peak_rss_mb"):
+        print(f"  {key:<22}{result[key]:>10}{delta(key, result[key])}")
+    print(f"  {'posts_published':<22}{result['posts_published']:>10}")
+    print(f"  work queue: {result['work_queue']}")
+    print(f"  service requests: {result['service_requests']} errors: {result['service_errors']}")
+
+    print(f"\n  {'stage':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    base_stages = (baseline or {}).get("stages", {})
+    for stage, st in result["stages"].items():
+        line = f"  {stage:<12}{st['count']:>7}{st['p50_ms']:>10}{st['p95_ms']:>10}{st['p99_ms']:>10}{st['max_ms']:>10}"
+        base = base_stages.get(stage)
+        if base and base["p95_ms"]:
+            line += f"   p95 {(st['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100:+.1f}%"
+        print(line)
+
+
+def main_bench():
+    args = parse_args()
+    services = FakeServices(
+        gemini=ServiceConfig(args.gemini_latency, args.gemini_error_rate),
+        bunny=ServiceConfig(args.bunny_latency, args.bunny_error_rate),
+        api=ServiceConfig(args.api_latency, args.api_error_rate),
+        seed=args.seed,
+    ).start()
+
+    with tempfile.TemporaryDirectory(prefix="scraper-bench-") as workdir:
+        configure_environment(args, services, workdir)
+        import main
+        import metrics
+        main.setup()
+
+        images = make_images(8, args.seed)
+        channels = {
+            f"bench_channel_{n}": generate_channel(args.posts, seed=args.seed + n, images=images,
+                                                   download_latency=args.download_latency)
+            for n in range(args.channels)
+        }
+        main.client = FakeTelegramClient(channels, latency=args.telegram_latency)
+        main.CHANNELS_CONFIG = [
+            {"channel_username": name, "default_thumbnail": "bench.jpg", "source": name} for name in channels
+        ]
+
+        # Keep raw stage timings for percentiles alongside the exported histogram
+        samples = {}
+        observe = metrics.STAGE_SECONDS.observe
+
+        def record(value, **labels):
+            samples.setdefault(labels.get("stage", "?"), []).append(value)
+            observe(value, **labels)
+        metrics.STAGE_SECONDS.observe = record
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        fetch_seconds = asyncio.run(run_pipeline(main, channels))
+        elapsed = time.perf_counter() - started
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = summarize(args, samples, elapsed, fetch_seconds, channels, services, main, metrics, peak_traced)
+        main.queue.close()
+        main.state.close()
+
+    services.stop()
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main_bench()
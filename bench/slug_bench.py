@@ -0,0 +1,150 @@
+"""
+Microbenchmark for slug.py and the near-duplicate index.
+
+    python bench/slug_bench.py --titles 5000 --existing 20000
+
+Compares the previous slug implementation (kept inline below as the baseline) with the
+translate table, the batch API and the persistent SlugIndex, then times MinHash
+signatures and LSH lookups. Inputs are seeded, so runs are comparable.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import slug  # noqa: E402
+from near_duplicate import NearDuplicateIndex, minhash, numbers  # noqa: E402
+
+
+# --- Baseline: slug.py before the translate table and SlugIndex ---
+
+def legacy_transliterate(text):
+    return "".join(slug.amharic_to_latin_map.get(ch, ch) for ch in text)
+
+
+def legacy_generate_slug(title, fallback_id=None):
+    if not title or title.strip() == "":
+        return f"post-{fallback_id}" if fallback_id is not None else "untitled"
+    s = legacy_transliterate(title.strip()).lower()
+    s = re.sub(r"[^a-z0-9]+", "-", s)
+    s = re.sub(r"^-+|-+$", "", s)
+    s = re.sub(r"-+", "-", s)
+    if len(s) > 100:
+        s = re.sub(r"-[^-]*$", "", s[:100])
+    return s or (f"post-{fallback_id}" if fallback_id is not None else "untitled")
+
+
+def legacy_ensure_unique_slug(base_slug, existing_slugs):
+    existing_slugs = set(existing_slugs)
+    s, counter = base_slug, 1
+    while s in existing_slugs:
+        s = f"{base_slug}-{counter}"
+        counter += 1
+    return s
+
+
+# --- Inputs ---
+
+AMHARIC_WORDS = ["የኢትዮጵያ", "ቡና", "የወጪ", "ንግድ", "ገቢ", "ጨምሯል", "ባለስልጣኑ", "ላኪዎች", "ጥራት", "ሎጂስቲክስ",
+                 "እንስሳት", "ሚኒስቴሩ", "ስልጠና", "ሰሊጥ", "ሻይ", "ቅመማ", "ቅመም", "ዓመት", "ሩብ", "ማረጋገጫ"]
+ENGLISH_WORDS = ["coffee", "export", "earnings", "rise", "quarter", "authority", "exporters", "quality",
+                 "logistics", "livestock", "ministry", "training", "sesame", "tea", "spice", "fair"]
+
+
+def make_titles(count, seed, vocabulary_size=None):
+    """Titles of 3-8 words; a small vocabulary makes repeated base slugs (the expensive case) common."""
+    rng = random.Random(seed)
+    words = AMHARIC_WORDS + ENGLISH_WORDS
+    if vocabulary_size:
+        words = words[:vocabulary_size]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(3, 8))) + rng.choice(["", "።", "!"])
+            for _ in range(count)]
+
+
+def timed(label, fn, count):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<44}{elapsed * 1000:>10.1f} ms{elapsed / count * 1e6:>10.2f} us/op")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=5000)
+    parser.add_argument("--existing", type=int, default=20000, help="Slugs already taken before the run")
+    parser.add_argument("--unique-titles", type=int, default=1000, help="Titles run through ensure_unique_slug")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    titles = make_titles(args.titles, args.seed)
+    print(f"Transliteration and slugs ({args.titles} titles)")
+    old, _ = timed("legacy transliterate", lambda: [legacy_transliterate(t) for t in titles], len(titles))
+    new, _ = timed("translate table", lambda: [slug.transliterate_amharic(t) for t in titles], len(titles))
+    mismatches = sum(1 for a, b in zip(old, new) if a != b)
+    print(f"  (outputs differ for {mismatches} titles: characters the old map left untransliterated)")
+    timed("legacy generate_slug", lambda: [legacy_generate_slug(t, i) for i, t in enumerate(titles)], len(titles))
+    timed("generate_slug", lambda: [slug.generate_slug(t, i) for i, t in enumerate(titles)], len(titles))
+    timed("generate_slugs (batch)", lambda: slug.generate_slugs(titles, list(range(len(titles)))), len(titles))
+
+    # Uniqueness against a large existing set with many repeated bases (bulk backfill)
+    existing_titles = make_titles(args.existing, args.seed + 1, vocabulary_size=6)
+    bases = [slug.generate_slug(t) for t in make_titles(args.unique_titles, args.seed + 2, vocabulary_size=6)]
+    existing = []
+    seen = set()
+    for t in existing_titles:
+        s = slug.ensure_unique_slug(slug.generate_slug(t), seen)
+        seen.add(s)
+        existing.append(s)
+
+    print(f"\nUniqueness ({args.unique_titles} new slugs against {len(existing)} existing)")
+
+    def legacy_unique():
+        taken = list(existing)
+        for b in bases:
+            taken.append(legacy_ensure_unique_slug(b, taken))
+        return taken[len(existing):]
+
+    def set_unique():
+        taken = set(existing)
+        out = []
+        for b in bases:
+            s = slug.ensure_unique_slug(b, taken)
+            taken.add(s)
+            out.append(s)
+        return out
+
+    with tempfile.TemporaryDirectory() as workdir:
+        index = slug.SlugIndex(os.path.join(workdir, "slugs.db"))
+        timed("SlugIndex.add_existing (one-off import)", lambda: index.add_existing(existing), len(existing))
+        legacy, _ = timed("legacy ensure_unique_slug (list)", legacy_unique, len(bases))
+        with_set, _ = timed("ensure_unique_slug (shared set)", set_unique, len(bases))
+        indexed, _ = timed("SlugIndex.reserve_many", lambda: index.reserve_many(bases), len(bases))
+        print(f"  (all unique: {len(set(indexed)) == len(indexed) and not set(indexed) & set(existing)}; "
+              f"same as legacy: {indexed == legacy == with_set})")
+        index.close()
+
+        print(f"\nNear-duplicate index ({args.unique_titles} posts)")
+        rng = random.Random(args.seed)
+        posts = [" ".join(make_titles(rng.randint(3, 6), args.seed + 10 + i)) for i in range(args.unique_titles)]
+        signatures, _ = timed("minhash", lambda: [minhash(p) for p in posts], len(posts))
+        near = NearDuplicateIndex(os.path.join(workdir, "near.db"))
+        now = time.time()
+        nums = [numbers(p) for p in posts]
+        timed("add", lambda: [near.add(str(i), "bench", s, now, n) for i, (s, n) in enumerate(zip(signatures, nums))],
+              len(posts))
+        for i in range(len(posts)):
+            near.mark_published(str(i))
+        found, _ = timed("find (all present)", lambda: [near.find(s, now, "other", n) for s, n in zip(signatures, nums)],
+                         len(posts))
+        print(f"  (matched {sum(1 for f in found if f)}/{len(found)})")
+        near.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+from typing import Callable, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from ai_cache import AICache, make_cache_key
+from http_client import get_http_client
+from metrics import AI_CALLS
+from rate_limiter import (GEMINI_MAX_RETRIES, PRIORITY_TRANSLATE, backoff_delay, estimate_tokens,
+                          get_rate_limiter, parse_retry_after)
+
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com/v1beta')
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', '1') == '1'
+
+_cache = None
+
+
+def get_ai_cache() -> Optional[AICache]:
+    global _cache
+    if _cache is None and AI_CACHE_ENABLED:
+        _cache = AICache()
+    return _cache
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _is_valid_json(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+async def generate_content(prompt: str, system_instruction: str, is_json: bool = False, timeout: int = 30,
+                           input_label: str = "Input", validate: Optional[Callable[[str], bool]] = None,
+                           priority: int = PRIORITY_TRANSLATE) -> str:
+    """
+    Sends one generateContent request and returns the response text.
+
+    Responses are served from the local AI cache when the same model, prompt and system
+    instruction were seen before. Only responses that pass `validate` (or parse as JSON
+    when is_json is set) are stored, so a malformed answer is never replayed.
+
+    Every request first takes its share of the process-wide rate limit (by `priority`).
+    429s, 5xx and network errors are retried up to GEMINI_MAX_RETRIES times with
+    jittered exponential backoff, honoring Retry-After. Raises once retries are
+    exhausted or on non-retryable errors; callers decide on the fallback.
+    """
+    cache = get_ai_cache()
+    key = make_cache_key(GEMINI_MODEL, prompt, system_instruction, is_json)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            AI_CALLS.inc(result="cached")
+            return cached
+
+    url = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    payload = {
+        "contents": [{
+            "parts": [{"text": f"{system_instruction}\n\n{input_label}:\n{prompt}"}]
+        }],
+        "generationConfig": {
+            "response_mime_type": "application/json" if is_json else "text/plain"
+        }
+    }
+
+    limiter = get_rate_limiter()
+    estimated = estimate_tokens(system_instruction) + 2 * estimate_tokens(prompt)  # Input plus expected output
+    attempt = 0
+    while True:
+        await limiter.acquire(estimated, priority)
+        response, retry_after = None, None
+        AI_CALLS.inc(result="requested")
+        try:
+            response = await get_http_client().post(url, json=payload, timeout=timeout)
+            if response.status_code not in RETRYABLE_STATUS:
+                break
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            error = f"HTTP {response.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+            if attempt >= GEMINI_MAX_RETRIES:
+                AI_CALLS.inc(result="failed")
+                raise
+
+        if attempt >= GEMINI_MAX_RETRIES:
+            AI_CALLS.inc(result="failed")
+            break  # raise_for_status below reports the last error
+        delay = backoff_delay(attempt, retry_after)
+        if response is not None and response.status_code == 429:
+            limiter.pause(delay)  # Everyone backs off, not just this caller
+        AI_CALLS.inc(result="retried")
+        print(f"      [Gemini Retry] {error}; attempt {attempt + 1}/{GEMINI_MAX_RETRIES} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    response.raise_for_status()
+    text = response.json()['candidates'][0]['content']['parts'][0]['text'].strip()
+
+    check = validate or (_is_valid_json if is_json else None)
+    if cache and (check is None or check(text)):
+        cache.put(key, text)
+    return text
@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from state_store import StateStore
+
+
+def _has_media(m) -> bool:
+    return bool(m.photo or m.document)
+
+
+class IncrementalGrouper:
+    """
+    Groups a channel's messages (captions + images) into posts across poll boundaries.
+
+    A message joins the open group when it belongs to the same Telegram album
+    (grouped_id) or arrives within max_gap_seconds of the group's last message.
+    The open group is kept in the state store between cycles and is only emitted
+    once it is provably closed: a later message started a new group, or
+    max_gap_seconds have passed since its last message.
+
+    feed() does not persist anything; callers save() the returned open group once the
+    closed groups have been handled, together with the channel checkpoint.
+
+    Emitted groups carry "media_ids" instead of Message objects, since a group may
+    have been opened by a previous process; callers resolve them as needed.
+    """
+    def __init__(self, store: StateStore, max_gap_seconds: int):
+        self.store = store
+        self.max_gap_seconds = max_gap_seconds
+
+    def _load(self, channel: str) -> Optional[dict]:
+        raw = self.store.get_open_group(channel)
+        if not raw:
+            return None
+        group = json.loads(raw)
+        group["start_date"] = datetime.fromisoformat(group["start_date"])
+        group["end_date"] = datetime.fromisoformat(group["end_date"])
+        return group
+
+    def save(self, channel: str, group: Optional[dict]) -> None:
+        if group is None:
+            self.store.set_open_group(channel, None)
+            return
+        data = dict(group, start_date=group["start_date"].isoformat(), end_date=group["end_date"].isoformat())
+        self.store.set_open_group(channel, json.dumps(data, ensure_ascii=False))
+
+    def _joins(self, group: dict, m) -> bool:
+        if m.grouped_id and m.grouped_id in group["grouped_ids"]:
+            return True
+        return (m.date - group["end_date"]).total_seconds() <= self.max_gap_seconds
+
+    @staticmethod
+    def _new_group(m) -> dict:
+        return {
+            "body": m.message or "",
+            "ids": [m.id],
+            "media_ids": [m.id] if _has_media(m) else [],
+            "grouped_ids": [m.grouped_id] if m.grouped_id else [],
+            "start_date": m.date,
+            "end_date": m.date,
+        }
+
+    @staticmethod
+    def _append(group: dict, m) -> None:
+        group["ids"].append(m.id)
+        group["end_date"] = max(group["end_date"], m.date)
+        if m.message:
+            group["body"] = f"{group['body']}\n\n{m.message}" if group["body"] else m.message
+        if _has_media(m):
+            group["media_ids"].append(m.id)
+        if m.grouped_id and m.grouped_id not in group["grouped_ids"]:
+            group["grouped_ids"].append(m.grouped_id)
+
+    def feed(self, channel: str, msgs, now: Optional[datetime] = None,
+             at_head: bool = True) -> Tuple[List[dict], Optional[dict]]:
+        """
+        Adds new messages (oldest first) to the stored open group.
+        Returns (closed_groups, open_group); the open group is not saved yet.
+
+        at_head: msgs reach the channel's newest message. Pass False for a full page of
+                 history: the next page may continue the last group however old it is,
+                 so it only closes on time once a fetch reaches the head.
+        """
+        now = now or datetime.now(timezone.utc)
+        current = self._load(channel)
+        closed = []
+
+        for m in msgs:
+            if current and m.id <= current["ids"][-1]:
+                continue  # Already part of the open group
+            if not m.message and not _has_media(m):
+                continue
+            if current and self._joins(current, m):
+                self._append(current, m)
+            else:
+                if current:
+                    closed.append(current)
+                current = self._new_group(m)
+
+        if current and at_head and (now - current["end_date"]).total_seconds() > self.max_gap_seconds:
+            closed.append(current)
+            current = None
+
+        return closed, current
+
+    def open_group(self, channel: str) -> Optional[dict]:
+        return self._load(channel)
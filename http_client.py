@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))  # Keep-alive connections per host
+HTTP_MAX_WORKERS = int(os.getenv("HTTP_MAX_WORKERS", "32"))  # Requests in flight across all hosts
+
+
+class AsyncHTTPClient:
+    """
+    Awaitable wrapper around one pooled requests.Session per host.
+
+    Requests run on a dedicated thread pool so the asyncio loop (and Telethon with it)
+    keeps running while Gemini, Bunny or the post API are slow. Each host keeps its own
+    keep-alive pool, so repeated calls skip the TCP+TLS handshake.
+    """
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_workers: int = HTTP_MAX_WORKERS):
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http")
+
+    def _session_for(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        session = self._session_for(url)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(session.request, method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+        self._executor.shutdown(wait=False)
+
+
+_http_client = None
+
+
+def get_http_client() -> AsyncHTTPClient:
+    """Process-wide client, so every module shares the same connection pools."""
+    global _http_client
+    if _http_client is None:
+        _http_client = AsyncHTTPClient()
+    return _http_client
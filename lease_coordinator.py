@@ -0,0 +1,167 @@
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Stable across restarts, so a restarted worker frees its in-flight jobs at once; several
+# workers on one host need a WORKER_ID each
+WORKER_ID = os.getenv("WORKER_ID") or socket.gethostname()
+COORDINATOR = os.getenv("COORDINATOR", "local")  # 'local' (one process owns everything) or 'sqlite'
+LEASE_DB_PATH = os.getenv("LEASE_DB_PATH", "leases.db")  # Must be shared by all workers (e.g. an NFS volume)
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "90"))  # A dead worker's channels are free after this
+LEASE_HEARTBEAT_SECONDS = int(os.getenv("LEASE_HEARTBEAT_SECONDS", "30"))
+
+
+class LocalCoordinator:
+    """
+    Single-worker coordinator: owns every channel. Also documents the interface a
+    coordinator provides (rebalance, owns, owned, release_all), so another backend
+    (Redis, etcd, ...) can stand in for SQLiteLeaseCoordinator.
+    """
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self._owned: Set[str] = set()
+
+    def rebalance(self, channels: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Renews this worker's leases and claims/gives up channels; returns (gained, lost)."""
+        channels = set(channels)
+        gained, lost = sorted(channels - self._owned), sorted(self._owned - channels)
+        self._owned = channels
+        return gained, lost
+
+    def owns(self, channel: str) -> bool:
+        return True  # No other worker can hold it
+
+    def owned(self) -> Set[str]:
+        return set(self._owned)
+
+    def release_all(self) -> None:
+        self._owned = set()
+
+
+class SQLiteLeaseCoordinator:
+    """
+    Assigns channels to workers through time-limited leases in a shared SQLite file.
+
+    workers:        heartbeat per worker; workers silent for LEASE_TTL_SECONDS are dead
+    channel_leases: current owner of each channel and when that lease expires
+
+    Every rebalance() (called every LEASE_HEARTBEAT_SECONDS) renews the worker's
+    heartbeat and leases, releases channels above its fair share (so a new worker gets
+    some) and claims free or expired channels up to that share, so a dead worker's
+    channels are taken over automatically. All of it runs in one IMMEDIATE transaction,
+    so two workers never own the same channel. The file uses a rollback journal: WAL
+    relies on shared memory, which does not work across hosts on a network filesystem.
+    """
+    def __init__(self, path: str = LEASE_DB_PATH, worker_id: str = WORKER_ID, ttl_seconds: int = LEASE_TTL_SECONDS):
+        self.path = path
+        self.worker_id = worker_id
+        self.ttl_seconds = ttl_seconds
+        self._owned: Dict[str, float] = {}  # channel -> lease expiry
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")  # Also turns WAL off on files created with it
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS channel_leases (
+                channel TEXT PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL NOT NULL DEFAULT 0
+            );
+            """
+        )
+
+    def rebalance(self, channels: Iterable[str]) -> Tuple[List[str], List[str]]:
+        channels = sorted(set(channels))
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO workers (worker_id, heartbeat_at) VALUES (?, ?)", (self.worker_id, now)
+                )
+                conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - self.ttl_seconds,))
+                conn.executemany("INSERT OR IGNORE INTO channel_leases (channel) VALUES (?)", [(c,) for c in channels])
+
+                live_workers = conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+                share = math.ceil(len(channels) / max(1, live_workers))
+
+                rows = conn.execute(
+                    "SELECT channel, owner, expires_at FROM channel_leases ORDER BY channel"
+                ).fetchall()
+                # Our own rows are still ours even if a slow heartbeat let them expire: nobody took them
+                mine = [c for c, owner, _ in rows if owner == self.worker_id and c in channels]
+                free = [c for c, owner, exp in rows
+                        if c in channels and owner != self.worker_id and (owner is None or exp < now)]
+
+                keep = mine[:share]
+                give_up = [c for c, owner, _ in rows if owner == self.worker_id and c not in keep]
+                take = free[:max(0, share - len(keep))]
+
+                conn.executemany(
+                    "UPDATE channel_leases SET owner = NULL, expires_at = 0 WHERE channel = ? AND owner = ?",
+                    [(c, self.worker_id) for c in give_up],
+                )
+                conn.executemany(
+                    "UPDATE channel_leases SET owner = ?, expires_at = ? WHERE channel = ?",
+                    [(self.worker_id, expires_at, c) for c in keep + take],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            before = set(self._owned)
+            self._owned = {c: expires_at for c in keep + take}
+        return sorted(set(self._owned) - before), sorted(before - set(self._owned))
+
+    def owns(self, channel: str) -> bool:
+        """True while this worker holds an unexpired lease (checked locally, no database round trip)."""
+        return self._owned.get(channel, 0) > time.time()
+
+    def owned(self) -> Set[str]:
+        now = time.time()
+        return {c for c, exp in self._owned.items() if exp > now}
+
+    def release_all(self) -> None:
+        """Gives the channels back immediately on a clean shutdown instead of waiting for expiry."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE channel_leases SET owner = NULL, expires_at = 0 WHERE owner = ?", (self.worker_id,)
+            )
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            self._owned = {}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def shared_store(path: str) -> dict:
+    """
+    Keyword arguments (path, shared) for a store every worker must see. With
+    COORDINATOR=sqlite it lives in the lease database, which is on the shared volume
+    by definition; otherwise in its own file at `path`.
+    """
+    if COORDINATOR == "sqlite":
+        return {"path": LEASE_DB_PATH, "shared": True}
+    return {"path": path, "shared": False}
+
+
+def make_coordinator():
+    if COORDINATOR == "sqlite":
+        return SQLiteLeaseCoordinator()
+    return LocalCoordinator()
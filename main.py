@@ -1,42 +1,74 @@
 import os
 import json
+import hashlib
 import random
 import string
 import time
 import re
 import asyncio
-import requests
+import tempfile
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from telethon import TelegramClient
-from slug import generate_slug
-from upload_to_bunny import upload_file_to_bunny, UploadProps
+from telethon import TelegramClient, events, utils
+from telethon.errors import FloodWaitError
+from gemini import generate_content, get_ai_cache
+from rate_limiter import PRIORITY_CLASSIFY, PRIORITY_TITLE, get_rate_limiter
+from http_client import get_http_client
+from slug import SLUG_INDEX_PATH, SlugIndex, generate_slug
+from media_policy import MAX_DOCUMENT_BYTES, select_media
+from media_index import MEDIA_INDEX_PATH, MediaIndex, perceptual_hashes, sha256_bytes
+from near_duplicate import NEAR_DUP_PATH, NearDuplicateIndex, minhash, numbers
+from metrics import (BYTES_DOWNLOADED, GROUPS, MESSAGES, POSTS_PUBLISHED, SKIPS, log_event, start_metrics_server,
+                     track_stage)
+from grouper import IncrementalGrouper
+from lease_coordinator import COORDINATOR, LEASE_HEARTBEAT_SECONDS, WORKER_ID, make_coordinator, shared_store
+from poll_scheduler import PollScheduler
+from profiling import CycleProfiler
+from relevance_scorer import RelevanceScorer
+from state_store import make_state_store
+from translate import translate_paragraphs
+from work_queue import WORK_QUEUE_PATH, WorkQueue, run_stage_workers
+from upload_to_bunny import upload_file_to_bunny, UploadProps, IMAGE_EXTS
 
 # --- INITIALIZATION ---
 load_dotenv()
 
 api_id = os.getenv('API_ID')
 api_hash = os.getenv('API_HASH')
-session_name = os.getenv('SESSION_NAME')
+session_name = os.getenv('SESSION_NAME', '').format(worker_id=WORKER_ID)  # e.g. "scraper_{worker_id}" per worker
+CHANNELS_CONFIG_PATH = os.getenv('CHANNELS_CONFIG_PATH')  # JSON list shaped like DEFAULT_CHANNELS_CONFIG
 API_BASE_URL = os.getenv('API_BASE_URL')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
 UPLOAD_TO_SERVER = True
-CHECK_INTERVAL_SECONDS = 600
-LOOKBACK_MINUTES = 10
+CHECK_INTERVAL_SECONDS = 600  # How often stats are printed; poll intervals are chosen by PollScheduler
+LOOKBACK_MINUTES = 10  # Only used to seed a channel that has no checkpoint yet
+MAX_MESSAGES_PER_CYCLE = 200
 MAX_IMAGES_PER_GROUP = 12
 MAX_TIME_DIFF_SECONDS = 120
+MEDIA_CONCURRENCY = int(os.getenv('MEDIA_CONCURRENCY', '4'))  # Media items downloaded/uploaded at once
+MEDIA_IN_MEMORY = os.getenv('MEDIA_IN_MEMORY', '1') == '1'  # Download media into RAM instead of downloads/
+MEDIA_DEDUP = os.getenv('MEDIA_DEDUP', '1') == '1'  # Reuse Bunny URLs of already uploaded images
+MEDIA_SPOOL_THRESHOLD = 8 * 1024 * 1024  # Documents above this are downloaded chunk by chunk into a spooled buffer
+INGEST_MODE = os.getenv('INGEST_MODE', 'poll')  # 'poll' or 'events'
+EVENT_SETTLE_SECONDS = int(os.getenv('EVENT_SETTLE_SECONDS', '5'))  # Batches pushed messages before grouping
+AI_MODE = os.getenv('AI_MODE', 'separate')  # 'separate' (3 calls per group) or 'combined' (1 call per batch)
+RELEVANCE_PREFILTER = os.getenv('RELEVANCE_PREFILTER', '1') == '1'  # Local scorer decides obvious cases
+ANALYZE_BATCH_SIZE = int(os.getenv('ANALYZE_BATCH_SIZE', '4'))  # Groups per combined Gemini request
+ENRICH_WORKERS = int(os.getenv('ENRICH_WORKERS', '2'))  # Concurrent AI stage workers
+MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', '2'))  # Concurrent media stage workers
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', '2'))  # Concurrent publish stage workers
+NEAR_DUP_ENABLED = os.getenv('NEAR_DUP_ENABLED', '1') == '1'  # Skip reworded copies of recent posts
+CHANNEL_CONCURRENCY = int(os.getenv('CHANNEL_CONCURRENCY', '4'))  # Channels polled in parallel
+MEDIA_MESSAGES_TTL_SECONDS = int(os.getenv('MEDIA_MESSAGES_TTL_SECONDS', '1800'))  # Then the media stage refetches
+CATCH_UP_RETRY_SECONDS = 30  # Pause before retrying a catch-up whose fetch failed
 
-CHANNELS_CONFIG = [
- {
-
-"channel_username": "t.me/ECTAuthority",
-
-"default_thumbnail": "eefd9c88-9d71-4fbe-8cd7-0d0f43dabd04.jpeg",
-
-"source": "ECTA"
-
-},
+DEFAULT_CHANNELS_CONFIG = [
+    {
+        "channel_username": "t.me/ECTAuthority",
+        "default_thumbnail": "eefd9c88-9d71-4fbe-8cd7-0d0f43dabd04.jpeg",
+        "source": "ECTA"
+    },
     {
         "channel_username": "t.me/motri_gov_et",
         "default_thumbnail": "155e1d47-4d84-487b-8b2e-7e70ebeb54ca.png",
@@ -44,89 +76,211 @@ CHANNELS_CONFIG = [
     }
 ]
 
-client = TelegramClient(session_name, api_id, api_hash)
+
+def load_channels_config():
+    """Channels from CHANNELS_CONFIG_PATH or the CHANNELS_CONFIG env var (JSON), else the defaults."""
+    if CHANNELS_CONFIG_PATH:
+        with open(CHANNELS_CONFIG_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    if os.getenv('CHANNELS_CONFIG'):
+        return json.loads(os.getenv('CHANNELS_CONFIG'))
+    return DEFAULT_CHANNELS_CONFIG
+
+
+CHANNELS_CONFIG = load_channels_config()
+
+# Created by setup(): the image worker processes import this module too (as __mp_main__)
+# and must not open the Telegram session or any store
+client = None
+state = None
+grouper = None
+queue = None
+coordinator = None  # Which channels this worker polls (COORDINATOR=sqlite shares them out)
+scorer = None
+media_index = None
+near_dups = None
+slug_index = None
+scheduler = PollScheduler()  # When each channel is polled next (run_forever)
+profiler = CycleProfiler()  # PROFILE_CYCLES at startup, or kill -USR1 <pid> to profile the next cycles
+_entity_cache = {}  # channel_username -> resolved Telegram entity
+_flood_wait_until = 0.0  # monotonic deadline shared by all channels after a FloodWaitError
+_media_semaphore = None  # Created lazily inside the running loop; shared by all groups and channels
+_channel_locks = {}  # channel_username -> asyncio.Lock, so polling and events never overlap on a channel
+_pending_events = {}  # channel_username -> messages pushed by Telegram but not yet grouped
+_flush_tasks = {}  # channel_username -> debounce task for _pending_events
+_caught_up = set()  # channel_usernames whose catch-up finished; pushed messages wait until then
+_catch_up_tasks = {}  # channel_username -> running catch_up_channel task
+_media_messages = {}  # post_id -> (expires_at, {message_id: Message}) fetched at enqueue time, for the media stage
 AMHARIC_PATTERN = re.compile(r'[\u1200-\u137F]')
 URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
 
 
+def setup():
+    """Opens the Telegram client and every store; run once before anything else in this module."""
+    global client, state, grouper, queue, coordinator, scorer, media_index, near_dups, slug_index
+    client = TelegramClient(session_name, api_id, api_hash)
+    state = make_state_store()  # Shared by all workers with COORDINATOR=sqlite
+    grouper = IncrementalGrouper(state, MAX_TIME_DIFF_SECONDS)
+    queue = WorkQueue(**shared_store(WORK_QUEUE_PATH), worker_id=WORKER_ID)  # Shared like state
+    coordinator = make_coordinator()
+    scorer = RelevanceScorer() if RELEVANCE_PREFILTER else None
+    # Cross-channel indexes are shared too, or copies and slug clashes between channels owned
+    # by different workers would go unnoticed
+    media_index = MediaIndex(**shared_store(MEDIA_INDEX_PATH)) if MEDIA_DEDUP and UPLOAD_TO_SERVER else None
+    near_dups = NearDuplicateIndex(**shared_store(NEAR_DUP_PATH)) if NEAR_DUP_ENABLED else None
+    slug_index = SlugIndex(**shared_store(SLUG_INDEX_PATH))
+
+
 # --- CORE AI LOGIC ---
 
 def is_amharic(text):
     return bool(AMHARIC_PATTERN.search(text))
 
 
-def call_gemini_ai(prompt, system_instruction, is_json=False):
+async def call_gemini_ai(prompt, system_instruction, is_json=False, priority=PRIORITY_CLASSIFY):
     """
     General purpose Gemini caller for classification and title generation.
     Does NOT skip based on Amharic detection.
+    Returns None when Gemini is still unavailable after the rate limiter's retries.
     """
     if not GEMINI_API_KEY:
         return None
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-
-    payload = {
-        "contents": [{
-            "parts": [{"text": f"{system_instruction}\n\nInput:\n{prompt}"}]
-        }],
-        "generationConfig": {
-            "response_mime_type": "application/json" if is_json else "text/plain"
-        }
-    }
-
     try:
-        response = requests.post(url, json=payload, timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        return result['candidates'][0]['content']['parts'][0]['text'].strip()
+        with track_stage("gemini"):
+            return await generate_content(prompt, system_instruction, is_json=is_json, timeout=30, priority=priority)
     except Exception as e:
         print(f"      [Gemini AI Error] {e}")
         return None
 
 
-def is_export_news_worthy(full_text):
-    """Checks if news is relevant to export trade."""
+async def is_export_news_worthy(full_text, prefiltered=None):
+    """
+    Checks if news is relevant to export trade.
+    Obvious cases are decided by the local scorer; only uncertain ones (and a sample of
+    the obvious ones, to audit the scorer) reach Gemini.
+    prefiltered: (verdict, audit) when the scorer already looked at the post, so it is
+    neither counted nor sampled for an audit twice.
+    Returns None when no answer could be obtained, so the group is retried instead of dropped.
+    """
+    if prefiltered is not None:
+        verdict, audit = prefiltered
+    else:
+        verdict = scorer.classify(full_text) if scorer else None
+        audit = verdict is not None and scorer.should_audit()
+    if verdict is not None and not audit:
+        return verdict
+
     system_instr = "You are a trade analyst. Respond with ONLY 'YES' or 'NO'."
     prompt = f"Is this news relevant to Ethiopia's export trade, logistics, or economy? Content: {full_text[:1500]}"
 
-    result = call_gemini_ai(prompt, system_instr)
-    return result and "YES" in result.upper()
+    if not GEMINI_API_KEY:
+        return False if verdict is None else verdict
+    result = await call_gemini_ai(prompt, system_instr, priority=PRIORITY_CLASSIFY)
+    if result is None:
+        return verdict  # An audited post keeps the scorer's verdict rather than being retried
+    relevant = "YES" in result.upper()
+    if scorer:
+        if verdict is not None:
+            scorer.record_audit(verdict, relevant)
+        scorer.record(full_text, relevant)
+    return relevant
 
 
-def generate_ai_titles(full_text):
-    """Generates Amharic and English titles in JSON format."""
+async def generate_ai_titles(full_text):
+    """Generates Amharic and English titles in JSON format (None if Gemini could not be reached)."""
     system_instr = "Generate a short title in Amharic and English. Return strictly JSON: {\"title\": \"...\", \"otherTitle\": \"...\"}"
     prompt = f"Content: {full_text[:2000]}"
 
-    result = call_gemini_ai(prompt, system_instr, is_json=True)
+    result = await call_gemini_ai(prompt, system_instr, is_json=True, priority=PRIORITY_TITLE)
+    if result is None and GEMINI_API_KEY:
+        return None
     try:
         return json.loads(result) if result else {"title": "News Update", "otherTitle": "News Update"}
     except:
         return {"title": "News Update", "otherTitle": "News Update"}
 
 
-def translate_batch_with_gemini(paragraphs):
-    """Body translation logic (keeps the Amharic-only optimization)."""
+async def translate_batch_with_gemini(paragraphs):
+    """
+    Body translation logic (keeps the Amharic-only optimization).
+    Long bodies are split into token-budgeted chunks translated concurrently (see translate.py).
+    Returns None when Gemini could not be reached, so the group is retried.
+    """
     if not GEMINI_API_KEY or not any(is_amharic(p) for p in paragraphs):
         return [None] * len(paragraphs)
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    system_instruction = (
-        "You are a translator. For each JSON string: If it contains Amharic, translate to English. "
-        "If not, return null. Return a JSON array of same length."
-    )
+    with track_stage("translate"):
+        return await translate_paragraphs(paragraphs)
 
-    payload = {
-        "contents": [{"parts": [
-            {"text": f"{system_instruction}\n\nInput JSON:\n{json.dumps(paragraphs, ensure_ascii=False)}"}]}],
-        "generationConfig": {"response_mime_type": "application/json"}
-    }
+
+def split_paragraphs(body):
+    return [p.strip() for p in body.split('\n') if p.strip()]
+
+
+ANALYZE_SYSTEM_INSTRUCTION = (
+    "You are a trade analyst and precise translator. You will receive a JSON array of posts, each with "
+    "\"content\" and \"paragraphs\". For every post return an object with: "
+    "\"relevant\": true if the news is relevant to Ethiopia's export trade, logistics, or economy, else false; "
+    "\"title\": a short Amharic title; \"otherTitle\": a short English title; "
+    "\"translations\": an array matching the length and order of \"paragraphs\" where each Amharic paragraph "
+    "is translated to English and every other paragraph is null. "
+    "Return strictly a JSON array of these objects, in the same order and of the same length as the input."
+)
+
+
+def _parse_analysis(text, groups, quiet=False):
+    """Validates a combined response; returns one analysis dict (or None) per group."""
+    results = json.loads(text)
+    if not isinstance(results, list) or len(results) != len(groups):
+        raise ValueError(f"Mismatch: Input {len(groups)} vs Output {len(results) if isinstance(results, list) else '?'}")
+
+    analyses = []
+    for g, r in zip(groups, results):
+        if not isinstance(r, dict) or "relevant" not in r:
+            analyses.append(None)
+            continue
+        paras = split_paragraphs(g["body"])
+        translations = r.get("translations")
+        if not isinstance(translations, list) or len(translations) != len(paras):
+            if not quiet:
+                print(f"  [Translation Error] Mismatch for {g['ids']}; falling back to a separate translation call")
+            translations = None
+        analyses.append({
+            "relevant": bool(r["relevant"]),
+            "title": {"title": r.get("title") or "News Update", "otherTitle": r.get("otherTitle") or "News Update"},
+            "translations": translations,
+        })
+    return analyses
+
+
+async def analyze_groups(groups):
+    """
+    Combined mode: one Gemini request returns relevance, titles and paragraph translations
+    for a whole batch of groups. Groups whose analysis is missing come back as None and
+    go through the separate per-group calls instead.
+    """
+    if not GEMINI_API_KEY or not groups:
+        return [None] * len(groups)
+
+    posts = [{"content": g["body"][:2000], "paragraphs": split_paragraphs(g["body"])} for g in groups]
+
+    def valid(text):
+        try:
+            _parse_analysis(text, groups, quiet=True)
+            return True
+        except (ValueError, TypeError):
+            return False
 
     try:
-        response = requests.post(url, json=payload, timeout=60)
-        return json.loads(response.json()['candidates'][0]['content']['parts'][0]['text'])
-    except:
-        return [None] * len(paragraphs)
+        with track_stage("gemini"):
+            result = await generate_content(json.dumps(posts, ensure_ascii=False), ANALYZE_SYSTEM_INSTRUCTION,
+                                            is_json=True, timeout=90, input_label="Input JSON", validate=valid,
+                                            priority=PRIORITY_CLASSIFY)
+        return _parse_analysis(result, groups)
+    except Exception as e:
+        print(f"      [Gemini AI Error] Combined analysis failed: {e}")
+        return [None] * len(groups)
 
 
 # --- TELEGRAM & PROCESSING LOGIC ---
@@ -135,135 +289,740 @@ def generate_random_id(length=12):
     return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(length))
 
 
-async def download_media(msg):
+async def download_media(msg, thumb=None):
     os.makedirs("downloads", exist_ok=True)
-    path = await msg.download_media(file=os.path.join("downloads", f"{msg.id}_{generate_random_id(4)}"))
+    with track_stage("download"):
+        path = await msg.download_media(file=os.path.join("downloads", f"{msg.id}_{generate_random_id(4)}"), thumb=thumb)
+    if path:
+        BYTES_DOWNLOADED.inc(os.path.getsize(path))
     return {"url": path, "name": os.path.basename(path) if path else "", "status": "complete" if path else "failed"}
 
 
+async def download_media_buffer(msg, thumb=None):
+    """
+    In-memory variant of download_media. `thumb` selects the photo size to fetch. Returns (name, data) where data is a memoryview,
+    or, for large documents, a spooled buffer filled chunk by chunk (uploaded the same way).
+    """
+    ext = (msg.file.ext if msg.file else None) or ''
+    name = f"{msg.id}{ext}"
+    size = msg.file.size if msg.file else None
+
+    with track_stage("download"):
+        if msg.document and size and size > MEDIA_SPOOL_THRESHOLD:
+            # Stays in memory up to the policy limit, so only a file larger than Telegram reported spills to disk
+            buf = tempfile.SpooledTemporaryFile(max_size=MAX_DOCUMENT_BYTES)
+            async for chunk in client.iter_download(msg.document):
+                buf.write(chunk)
+            BYTES_DOWNLOADED.inc(buf.tell())
+            buf.seek(0)
+            return name, buf
+
+        data = await msg.download_media(file=bytes, thumb=thumb)
+    if data:
+        BYTES_DOWNLOADED.inc(len(data))
+    return name, memoryview(data) if data else None
+
+
+async def process_group_media(media, post_id):
+    """
+    Downloads and uploads a group's media concurrently (at most MEDIA_CONCURRENCY at once
+    across the whole process) and returns one gallery entry per message, in order
+    (None where the message adds nothing).
+    """
+    global _media_semaphore
+    if _media_semaphore is None:
+        _media_semaphore = asyncio.Semaphore(MEDIA_CONCURRENCY)
+
+    async def limited(m):
+        async with _media_semaphore:
+            try:
+                return await upload_message_media(m, post_id)
+            except Exception as e:
+                print(f"    [Download Error] {m.id}: {e}")
+                return {"url": "", "name": str(m.id), "status": "failed"}  # Lets the media stage retry
+
+    return await asyncio.gather(*(limited(m) for m in media))
+
+
+def report_image_stats(name, stats):
+    if not stats:
+        return
+    parts = [f"{v}: {st['ms']}ms {st['bytes'] // 1024}KB ({st['saved_pct']}% saved)" for v, st in stats["variants"].items()]
+    print(f"      [IMAGE] {name} decode {stats['decode_ms']}ms | " + " | ".join(parts))
+
+
+def telegram_media_id(msg):
+    """Stable id of the underlying photo/document; forwards and reposts of the same file share it."""
+    if msg.photo:
+        return f"photo:{msg.photo.id}"
+    if msg.document:
+        return f"document:{msg.document.id}"
+    return None
+
+
+async def find_indexed_media(name, data):
+    """Looks a downloaded buffer up by SHA-256, then (images only) by perceptual hash."""
+    if hasattr(data, "read"):
+        h = hashlib.sha256()
+        for chunk in iter(lambda: data.read(1024 * 1024), b""):
+            h.update(chunk)
+        data.seek(0)
+        sha = h.hexdigest()
+    else:
+        sha = sha256_bytes(data)
+
+    url = media_index.lookup_sha256(sha)
+    hashes = None
+    if not url and not hasattr(data, "read") and name.rsplit(".", 1)[-1].lower() in IMAGE_EXTS:
+        try:
+            hashes = await asyncio.to_thread(perceptual_hashes, data)
+            url = media_index.lookup_phash(*hashes)
+        except Exception:
+            hashes = None
+    return url, sha, hashes
+
+
+async def upload_message_media(msg, post_id):
+    """Downloads one media message, uploads it to Bunny and returns its gallery entry (None if nothing to add)."""
+    decision = select_media(msg)
+    if decision.skip:
+        print(f"      [SKIP MEDIA] {msg.id}: {decision.reason}")
+        SKIPS.inc(reason="media_policy")
+        return None
+
+    tg_id = telegram_media_id(msg)
+    if media_index and tg_id:
+        url = media_index.lookup_file_id(tg_id)
+        if url:
+            print(f"      [DEDUP] Reusing {url} for {tg_id} (skipped download)")
+            SKIPS.inc(reason="media_dedup")
+            ext = (msg.file.ext if msg.file else None) or ''
+            return {"url": url, "name": f"{msg.id}{ext}", "status": "complete"}
+
+    if MEDIA_IN_MEMORY:
+        name, data = await download_media_buffer(msg, thumb=decision.thumb)
+        if data is None:
+            raise RuntimeError("Telegram returned no data")
+        entry = {"url": "", "name": name, "status": "complete"}
+        try:
+            if UPLOAD_TO_SERVER:
+                sha = hashes = None
+                if media_index:
+                    url, sha, hashes = await find_indexed_media(name, data)
+                    if url:
+                        print(f"      [DEDUP] Reusing {url} for {name} (skipped encode/upload)")
+                        SKIPS.inc(reason="media_dedup")
+                        media_index.add(url, tg_file_id=tg_id)
+                        entry['url'] = url
+                        return entry
+
+                upload_res = await upload_file_to_bunny(
+                    UploadProps(file=data, table_name="post", ref_id=post_id, file_name=name))
+                entry['url'] = upload_res.file_url
+                report_image_stats(name, upload_res.stats)
+                if media_index and upload_res.file_url and not upload_res.error:
+                    media_index.add(upload_res.file_url, tg_file_id=tg_id, sha256=sha,
+                                    phash=hashes[0] if hashes else None, detail=hashes[1] if hashes else None)
+        except Exception as e:
+            print(f"    [Upload Error] {e}")
+        finally:
+            if hasattr(data, "close"):
+                data.close()
+        return entry
+
+    entry = await download_media(msg, thumb=decision.thumb)
+    local_path = entry.get('url')  # Full path: e.g., 'downloads/123.jpg'
+    if not (local_path and os.path.exists(local_path)):
+        raise RuntimeError("Telegram returned no file")
+
+    if UPLOAD_TO_SERVER:
+        try:
+            with open(local_path, "rb") as f:
+                upload_res = await upload_file_to_bunny(
+                    UploadProps(file=f, table_name="post", ref_id=post_id, file_name=entry['name']))
+                entry['url'] = upload_res.file_url
+                report_image_stats(entry['name'], upload_res.stats)
+                if media_index and upload_res.file_url and not upload_res.error:
+                    media_index.add(upload_res.file_url, tg_file_id=tg_id)
+        except Exception as e:
+            print(f"    [Upload Error] {e}")
+        finally:
+            # CLEANUP: the local copy is removed even when the upload fails
+            os.remove(local_path)
+    return entry
+
+
+async def get_channel_entity(username):
+    """Resolves a channel once and reuses the entity on every later poll."""
+    entity = _entity_cache.get(username)
+    if entity is None:
+        entity = await client.get_entity(username)
+        _entity_cache[username] = entity
+    return entity
+
+
+def note_flood_wait(seconds):
+    """Pauses every channel until Telegram's flood-wait has expired."""
+    global _flood_wait_until
+    _flood_wait_until = max(_flood_wait_until, time.monotonic() + seconds)
+
+
+async def wait_for_flood_gate():
+    delay = _flood_wait_until - time.monotonic()
+    if delay > 0:
+        print(f"    [FLOOD] Waiting {int(delay)}s before the next Telegram request...")
+        await asyncio.sleep(delay)
+
+
 async def process_batch(config):
+    """
+    Fetches and processes up to MAX_MESSAGES_PER_CYCLE new messages of a channel; returns
+    them, or None when the fetch failed. The checkpoint is read and advanced under the
+    channel lock, so a concurrent flush of pushed messages cannot skip past this page.
+    """
+    target_channel = config['channel_username']
+    async with _channel_lock(target_channel):
+        msgs = await _fetch_new_messages(config)
+        if msgs is not None:
+            # A full page means more history is waiting, which may continue the last group
+            await _process_messages_locked(config, msgs, at_head=len(msgs) < MAX_MESSAGES_PER_CYCLE)
+    return msgs
+
+
+async def _fetch_new_messages(config):
     target_channel = config['channel_username']
-    default_thumb = config['default_thumbnail']
-    source_name = config['source']
 
     print(f"[{datetime.now().strftime('%H:%M:%S')}] Checking: {target_channel}")
 
     try:
-        # Get the channel entity
-        channel = await client.get_entity(target_channel)
+        # Get the channel entity (cached after the first lookup)
+        channel = await get_channel_entity(target_channel)
 
-        # Calculate cutoff time
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=LOOKBACK_MINUTES)
-
-        # 1. IMMEDIATE SKIP IF NO RECENT MESSAGES
-        msgs = []
-        async for m in client.iter_messages(channel, limit=50):
-            if m.date < cutoff:
-                break
-            msgs.append(m)
+        # 1. INCREMENTAL FETCH: resume from the stored checkpoint (oldest first)
+        last_id = state.get_last_message_id(target_channel)
+        if last_id is None:
+            # First run for this channel: seed from the lookback window instead of the whole history
+            cutoff = datetime.now(timezone.utc) - timedelta(minutes=LOOKBACK_MINUTES)
+            history = client.iter_messages(channel, offset_date=cutoff, reverse=True, limit=MAX_MESSAGES_PER_CYCLE)
+        else:
+            history = client.iter_messages(channel, min_id=last_id, reverse=True, limit=MAX_MESSAGES_PER_CYCLE)
 
-        if not msgs:
-            print(f"    [SKIP] No new messages in the last {LOOKBACK_MINUTES} minutes.")
-            return  # This prevents the script from getting stuck on inactive channels
+        with track_stage("fetch"):
+            msgs = [m async for m in history]
+        MESSAGES.inc(len(msgs), channel=target_channel)
 
-        msgs.reverse()
+        if not msgs and not grouper.open_group(target_channel):
+            print(f"    [SKIP] No new messages since {last_id if last_id is not None else 'lookback window'}.")
+        return msgs
+    except FloodWaitError as e:
+        note_flood_wait(e.seconds)
+        print(f"  [Flood wait on {target_channel}] {e.seconds}s")
+        return None
     except Exception as e:
         print(f"  [Error accessing {target_channel}] {e}")
-        return
+        return None
 
-    # --- Grouping and Filtering Logic ---
-    groups, current = [], None
-    for m in msgs:
-        if not m.message and not (m.photo or m.document):
-            continue
 
-        # Logic to group related messages (captions + images)
-        if not current or (m.date - current["end_date"]).total_seconds() > MAX_TIME_DIFF_SECONDS:
-            if current: groups.append(current)
-            current = {
-                "body": m.message or "",
-                "ids": [m.id],
-                "end_date": m.date,
-                "media": [m] if (m.photo or m.document) else [],
-                "start_date": m.date
-            }
-        else:
-            current["ids"].append(m.id)
-            current["end_date"] = m.date
-            if m.message: current["body"] += f"\n\n{m.message}"
-            if (m.photo or m.document): current["media"].append(m)
+def make_post_id(channel, group_key, length=12):
+    """Deterministic post id for a group; doubles as the work queue's idempotency key."""
+    alphabet = string.ascii_letters + string.digits
+    n = int.from_bytes(hashlib.sha256(f"{channel}:{group_key}".encode("utf-8")).digest(), "big")
+    chars = []
+    for _ in range(length):
+        n, r = divmod(n, len(alphabet))
+        chars.append(alphabet[r])
+    return "".join(chars)
+
+
+async def resolve_media(target_channel, media_ids, known=None):
+    """Message objects for media_ids in order, fetching the ones not already at hand."""
+    by_id = dict(known or {})
+    missing = [i for i in media_ids if i not in by_id]
+    if missing:
+        channel = await get_channel_entity(target_channel)
+        for m in await client.get_messages(channel, ids=missing):
+            if m:
+                by_id[m.id] = m
+    return [by_id[i] for i in media_ids if i in by_id]
 
-    if current:
-        groups.append(current)
+
+def enqueue_groups(config, groups, by_id=None):
+    """
+    Hands closed groups to the work queue, skipping ones already processed.
+    by_id maps message ids to Message objects the caller already fetched, so the
+    media stage does not have to fetch them again.
+    """
+    target_channel = config['channel_username']
+    done_keys = state.processed_group_keys(target_channel, [str(g["ids"][0]) for g in groups])
+    queued = 0
 
     for g in groups:
+        group_key = str(g["ids"][0])
+        if group_key in done_keys:
+            print(f"    [SKIP] Already processed: {g['ids']}")
+            SKIPS.inc(reason="already_processed")
+            continue
         if len(g["body"].strip()) < 20:
+            state.mark_group_processed(target_channel, group_key, status="skipped")
+            SKIPS.inc(reason="short_body")
             continue
 
-        # 2. Worthiness Check
-        if not is_export_news_worthy(g["body"]):
-            print(f"    [SKIP] Not relevant: {g['ids']}")
+        post_id = make_post_id(target_channel, group_key)
+        if near_dups:
+            # Same announcement already published from another channel: link it instead of paying for it again
+            posted_at = g["end_date"].timestamp()
+            signature, nums = minhash(g["body"]), numbers(g["body"])
+            match = near_dups.find(signature, posted_at, target_channel, nums)
+            if match and match[0] != post_id:
+                duplicate_of, score = match
+                near_dups.link(target_channel, group_key, duplicate_of, score)
+                state.mark_group_processed(target_channel, group_key, status="duplicate")
+                log_event("duplicate", f"    [SKIP] Near-duplicate of {duplicate_of} ({score:.2f}): {g['ids']}",
+                          post_id=post_id, duplicate_of=duplicate_of, similarity=score)
+                SKIPS.inc(reason="near_duplicate")
+                continue
+            near_dups.add(post_id, target_channel, signature, posted_at, nums)
+
+        if queue.enqueue(post_id, target_channel, {
+            "ids": g["ids"],
+            "media_ids": g["media_ids"],
+            "body": g["body"],
+            "source": config['source'],
+            "default_thumbnail": config['default_thumbnail'],
+        }):
+            if by_id and g["media_ids"]:
+                _remember_media_messages(post_id, {i: by_id[i] for i in g["media_ids"] if i in by_id})
+            log_event("queued", f"    [QUEUED] {post_id} {g['ids']}", post_id=post_id, channel=target_channel,
+                      ids=g["ids"])
+            GROUPS.inc(channel=target_channel)
+            queued += 1
+        state.mark_group_processed(target_channel, group_key, status="queued")
+    return queued
+
+
+def _remember_media_messages(post_id, messages):
+    """
+    Keeps the group's media messages so the media stage can skip refetching them. Jobs that
+    end before the media stage, or whose media stage runs on another worker, never collect
+    theirs, so entries expire after MEDIA_MESSAGES_TTL_SECONDS.
+    """
+    now = time.monotonic()
+    while _media_messages:
+        oldest = next(iter(_media_messages))
+        if _media_messages[oldest][0] > now:
+            break
+        del _media_messages[oldest]
+    _media_messages[post_id] = (now + MEDIA_MESSAGES_TTL_SECONDS, messages)
+
+
+async def process_messages(config, msgs):
+    """
+    Shared entry point for polled and pushed messages: group, dedupe, enqueue, checkpoint.
+    Groups still open (a caption or album may continue in the next cycle) are kept in
+    the state store; closed groups go to the durable work queue, whose stage workers
+    do the AI, media and publish work.
+    """
+    async with _channel_lock(config['channel_username']):
+        await _process_messages_locked(config, msgs)
+
+
+def _channel_lock(target_channel):
+    return _channel_locks.setdefault(target_channel, asyncio.Lock())
+
+
+async def _process_messages_locked(config, msgs, at_head=True):
+    target_channel = config['channel_username']
+    if not coordinator.owns(target_channel):
+        print(f"    [LEASE] {target_channel} is owned by another worker; dropping {len(msgs)} messages")
+        return
+    last_id = state.get_last_message_id(target_channel) or 0
+    msgs = sorted((m for m in msgs if m.id > last_id), key=lambda m: m.id)
+
+    groups, open_group = grouper.feed(target_channel, msgs, at_head=at_head)
+    if open_group:
+        print(f"    [OPEN] Waiting for group {open_group['ids']} to close")
+
+    enqueue_groups(config, groups, {m.id: m for m in msgs})
+    grouper.save(target_channel, open_group)
+    if msgs:
+        state.set_last_message_id(target_channel, msgs[-1].id)
+
+
+# --- PIPELINE STAGES (run by work_queue workers) ---
+
+async def enrich_job(job, analysis=None, prefiltered=None):
+    """AI stage: relevance, titles and body translation. Raises to retry the stage."""
+    data = dict(job.data)
+    body = data["body"]
+
+    # 2. Worthiness Check
+    relevant = analysis["relevant"] if analysis else await is_export_news_worthy(body, prefiltered)
+    if relevant is None:
+        raise RuntimeError("Relevance unknown (Gemini unavailable)")
+    if not relevant:
+        log_event("skip", f"    [SKIP] Not relevant: {data['ids']}", post_id=job.key, reason="not_relevant")
+        SKIPS.inc(reason="not_relevant")
+        _media_messages.pop(job.key, None)
+        return "skipped", data
+
+    # 3. AI Title Generation
+    title_obj = analysis["title"] if analysis else await generate_ai_titles(body)
+    if title_obj is None:
+        raise RuntimeError("Title generation failed (Gemini unavailable)")
+    log_event("match", f"    [MATCH] Title: {title_obj['title']}", post_id=job.key, title=title_obj['title'])
+
+    # 4. Body Translation
+    paras = split_paragraphs(body)
+    if analysis and analysis["translations"] is not None:
+        trans = analysis["translations"]
+    else:
+        trans = await translate_batch_with_gemini(paras)
+        if trans is None:
+            raise RuntimeError("Translation failed (Gemini unavailable)")
+
+    data.update(title=title_obj, translations=trans)
+    return "media", data
+
+
+async def enrich_stage(jobs):
+    """Runs enrich_job per job; in combined mode the whole batch shares one Gemini request."""
+    outcomes = [None] * len(jobs)
+    analyses = [None] * len(jobs)
+    prefiltered = [None] * len(jobs)  # Scorer verdicts, reused if the combined request fails
+
+    if AI_MODE == 'combined':
+        todo = []
+        audited = {}  # Index -> confident verdict that Gemini checks as well
+        for i, job in enumerate(jobs):
+            verdict = scorer.classify(job.data["body"]) if scorer else None
+            audit = verdict is False and scorer.should_audit()
+            if scorer:
+                prefiltered[i] = (verdict, audit)
+            if audit:
+                audited[i] = verdict
+                todo.append(i)
+            elif verdict is False:
+                log_event("skip", f"    [SKIP] Not relevant: {job.data['ids']}", post_id=job.key,
+                          reason="not_relevant")
+                SKIPS.inc(reason="not_relevant")
+                _media_messages.pop(job.key, None)
+                outcomes[i] = ("skipped", job.data)
+            else:
+                if verdict is True:
+                    audited[i] = verdict  # Sent to Gemini for titles anyway, so checking it is free
+                todo.append(i)
+
+        batch = [jobs[i].data for i in todo]
+        for i, analysis in zip(todo, await analyze_groups(batch)):
+            analyses[i] = analysis
+            if scorer and analysis:
+                if i in audited:
+                    scorer.record_audit(audited[i], analysis["relevant"])
+                scorer.record(jobs[i].data["body"], analysis["relevant"])
+
+    for i, job in enumerate(jobs):
+        if outcomes[i] is not None:
             continue
+        try:
+            outcomes[i] = await enrich_job(job, analyses[i], prefiltered[i])
+        except Exception as e:
+            outcomes[i] = e
+            if queue.is_last_attempt(job):
+                _media_messages.pop(job.key, None)  # The job is about to be marked failed
+    return outcomes
+
+
+async def media_job(job):
+    """
+    Media stage: download, dedupe, encode and upload the group's media. Finished items
+    are kept in the job, so a retry only redoes the ones that failed.
+    """
+    data = dict(job.data)
+    done = dict(data.get("media_done", {}))  # str(message id) -> gallery entry (None: nothing to add)
+    _, known = _media_messages.pop(job.key, (None, None))
+    media = await resolve_media(job.channel, [i for i in data["media_ids"] if str(i) not in done], known)
+    media = media[:max(0, MAX_IMAGES_PER_GROUP - len(done))]
+
+    failed = 0
+    for m, entry in zip(media, await process_group_media(media, job.key)):
+        if entry and (entry["status"] == "failed" or (UPLOAD_TO_SERVER and not entry["url"])):
+            failed += 1
+        else:
+            done[str(m.id)] = entry
+    if failed and not queue.is_last_attempt(job):
+        data["media_done"] = done
+        queue.save_progress(job, data)
+        raise RuntimeError(f"{failed} media items failed to download or upload")
+
+    # On the last attempt, publish what we have rather than nothing
+    data.pop("media_done", None)
+    data["gallery"] = [done[str(i)] for i in data["media_ids"] if done.get(str(i))]
+    return "publish", data
+
 
-        # 3. AI Title Generation
-        post_id = generate_random_id(12)
-        title_obj = generate_ai_titles(g["body"])
-        print(f"    [MATCH] Title: {title_obj['title']}")
-
-        # 4. Media Handling (with Fixed File Paths)
-        gallery = []
-        for m in g["media"][:MAX_IMAGES_PER_GROUP]:
-            entry = await download_media(m)
-            local_path = entry.get('url')  # Full path: e.g., 'downloads/123.jpg'
-
-            if local_path and os.path.exists(local_path):
-                if UPLOAD_TO_SERVER:
-                    try:
-                        with open(local_path, "rb") as f:
-                            f.filename = entry['name']
-                            upload_res = upload_file_to_bunny(UploadProps(file=f, table_name="post", ref_id=post_id))
-                            entry['url'] = upload_res.file_url
-
-                        # CLEANUP: Remove the local file using the correct path
-                        os.remove(local_path)
-                    except Exception as e:
-                        print(f"    [Upload Error] {e}")
-                gallery.append(entry)
-
-        # 5. Body Translation
-        paras = [p.strip() for p in g["body"].split('\n') if p.strip()]
-        trans = translate_batch_with_gemini(paras)
-        blocks = [
-            {"id": generate_random_id(12), "type": "paragraph", "data": {"text": p, "englishText": trans[i] or ""}} for
-            i, p in enumerate(paras)]
-
-        payload = {
-            "id": post_id,
-            "title": title_obj,
-            "slug": generate_slug(title_obj["title"], post_id),
-            "source": source_name,
-            "body": {"time": int(time.time() * 1000), "blocks": blocks, "version": "2.31.0"},
-            "imageUrl": gallery[0]['url'] if gallery else default_thumb,
-            "galleryImages": gallery
-        }
-
-        # 6. Upload to API
-        if UPLOAD_TO_SERVER and API_BASE_URL:
+async def publish_job(job):
+    """Publish stage: builds the post payload and PUTs it under the job's post id."""
+    data = job.data
+    post_id = job.key
+    title_obj = data["title"]
+    gallery = data["gallery"]
+    paras = split_paragraphs(data["body"])
+    trans = data["translations"]
+
+    blocks = [
+        {"id": generate_random_id(12), "type": "paragraph", "data": {"text": p, "englishText": trans[i] or ""}} for
+        i, p in enumerate(paras)]
+
+    payload = {
+        "id": post_id,
+        "title": title_obj,
+        "slug": slug_index.reserve(generate_slug(title_obj["title"], post_id), owner=post_id),
+        "source": data["source"],
+        "body": {"time": int(time.time() * 1000), "blocks": blocks, "version": "2.31.0"},
+        "imageUrl": gallery[0]['url'] if gallery else data["default_thumbnail"],
+        "galleryImages": gallery
+    }
+
+    # 5. Upload to API (idempotent: retries PUT the same post id)
+    if UPLOAD_TO_SERVER and API_BASE_URL:
+        with track_stage("publish"):
+            res = await get_http_client().put(API_BASE_URL.replace("[id]", post_id), json=payload, timeout=10)
+            res.raise_for_status()
+        POSTS_PUBLISHED.inc(source=data["source"])
+        log_event("published", f"    [SUCCESS] Uploaded {post_id}", post_id=post_id, source=data["source"])
+    if near_dups:
+        near_dups.mark_published(post_id)
+
+    return "done", data
+
+
+def _per_job(handler):
+    """Adapts a single-job coroutine to a stage handler returning one outcome per job."""
+    async def run(jobs):
+        outcomes = []
+        for job in jobs:
             try:
-                requests.put(API_BASE_URL.replace("[id]", post_id), json=payload, timeout=10)
-                print(f"    [SUCCESS] Uploaded {post_id}")
+                outcomes.append(await handler(job))
             except Exception as e:
-                print(f"    [API Error] {e}")
+                outcomes.append(e)
+        return outcomes
+    return run
+
+
+def start_pipeline():
+    """Starts the stage workers and the metrics endpoint; jobs left in flight by a previous run are resumed."""
+    queue.release_leases(all_workers=COORDINATOR == "local")  # A single worker has no one to wait for
+    enrich_batch = ANALYZE_BATCH_SIZE if AI_MODE == 'combined' else 1
+    return [
+        asyncio.create_task(start_metrics_server()),
+        asyncio.create_task(run_stage_workers(queue, "enrich", enrich_stage, ENRICH_WORKERS, enrich_batch)),
+        asyncio.create_task(run_stage_workers(queue, "media", _per_job(media_job), MEDIA_WORKERS)),
+        asyncio.create_task(run_stage_workers(queue, "publish", _per_job(publish_job), PUBLISH_WORKERS)),
+    ]
+
+
+async def poll_channel(config, semaphore):
+    async with semaphore:
+        await wait_for_flood_gate()
+        return await process_batch(config)
+
+
+async def maintain_leases(on_acquired=None):
+    """
+    Heartbeat: renews this worker's channel leases every LEASE_HEARTBEAT_SECONDS, gives up
+    channels above its fair share and takes over channels whose worker died.
+    """
+    configs = {c['channel_username']: c for c in CHANNELS_CONFIG}
+    while True:
+        try:
+            gained, lost = coordinator.rebalance(configs)
+        except Exception as e:
+            print(f"  [LEASE] Heartbeat failed: {e}")
+        else:
+            for channel in gained:
+                print(f"  [LEASE] {WORKER_ID} now owns {channel}")
+                if on_acquired:
+                    on_acquired(configs[channel])
+            for channel in lost:
+                print(f"  [LEASE] {WORKER_ID} released {channel}")
+        await asyncio.sleep(LEASE_HEARTBEAT_SECONDS)
+
+
+def owned_configs():
+    return [c for c in CHANNELS_CONFIG if coordinator.owns(c['channel_username'])]
+
+
+def print_stats():
+    cache = get_ai_cache()
+    if cache:
+        print(f"AI cache: {cache.stats()}")
+    if scorer:
+        print(f"Relevance pre-filter: {scorer.stats()}")
+    print(f"Gemini rate limiter: {get_rate_limiter().stats()}")
+    print(f"Work queue: {queue.counts()}")
+    if near_dups:
+        near_dups.prune()
+        print(f"Near-duplicates: {near_dups.stats()}")
+    print(f"Poll schedule: {json.dumps(scheduler.intervals())}")
 
 
 async def run_forever():
+    """
+    Polls each owned channel when the scheduler says it is due: busy channels every
+    POLL_MIN_INTERVAL_SECONDS or so, quiet ones backing off up to POLL_MAX_INTERVAL_SECONDS.
+    """
+    semaphore = asyncio.Semaphore(CHANNEL_CONCURRENCY)
+    pipeline = start_pipeline()
+    pipeline.append(asyncio.create_task(maintain_leases()))
+    await asyncio.sleep(0)  # Let the first rebalance run before the first poll
+    profiler.install_signal_handler()
+    next_stats = time.monotonic() + CHECK_INTERVAL_SECONDS
     while True:
-        for config in CHANNELS_CONFIG:
-            await process_batch(config)
-            await asyncio.sleep(5)
-        print(f"Cycle complete. Sleeping for {CHECK_INTERVAL_SECONDS}s...")
-        await asyncio.sleep(CHECK_INTERVAL_SECONDS)
+        # A profiled cycle includes the wait, so stage work done between polls is covered too
+        with profiler.cycle("poll"):
+            configs = {c['channel_username']: c for c in owned_configs()}
+            scheduler.sync(configs)
+            due = [configs[name] for name in scheduler.due()]
+            results = await asyncio.gather(
+                *(poll_channel(config, semaphore) for config in due),
+                return_exceptions=True
+            )
+            for config, res in zip(due, results):
+                target_channel = config['channel_username']
+                if isinstance(res, Exception):
+                    print(f"  [Error processing {target_channel}] {res}")
+                    res = None
+                # An open group closes MAX_TIME_DIFF_SECONDS after its last message; look again by then
+                recheck = MAX_TIME_DIFF_SECONDS + 1 if grouper.open_group(target_channel) else None
+                interval = scheduler.record(target_channel, None if res is None else [m.date for m in res],
+                                            recheck_in=recheck)
+                print(f"    [SCHEDULE] Next poll of {target_channel} in {int(min(interval, recheck or interval))}s")
+
+            if time.monotonic() >= next_stats:
+                print_stats()
+                next_stats = time.monotonic() + CHECK_INTERVAL_SECONDS
+            # Wake up at least every heartbeat so newly leased channels are polled promptly
+            wait = scheduler.next_due_in()
+            await asyncio.sleep(LEASE_HEARTBEAT_SECONDS if wait is None else min(wait, LEASE_HEARTBEAT_SECONDS))
+
+
+async def catch_up_channel(config, semaphore):
+    """
+    Fetches everything posted since the checkpoint, page by page until a short page,
+    then releases the pushed messages held back meanwhile. Until it finishes, a flush
+    could advance the checkpoint past messages the catch-up has not fetched yet.
+    """
+    target_channel = config['channel_username']
+    _caught_up.discard(target_channel)
+    while coordinator.owns(target_channel):
+        msgs = await poll_channel(config, semaphore)
+        if msgs is None:
+            await asyncio.sleep(CATCH_UP_RETRY_SECONDS)
+        elif len(msgs) < MAX_MESSAGES_PER_CYCLE:
+            break
+    else:
+        return  # Lost the lease while catching up; the new owner catches up instead
+
+    _caught_up.add(target_channel)
+    print(f"    [CATCH-UP] {target_channel} is up to date")
+    if target_channel in _flush_tasks:
+        return
+    if _pending_events.get(target_channel):
+        buffer_pushed_messages(config, [], delay=0)
+    elif grouper.open_group(target_channel):
+        # Nothing else re-runs the grouper until the channel posts again
+        buffer_pushed_messages(config, [], delay=MAX_TIME_DIFF_SECONDS + 1)
+
+
+def start_catch_up(config, semaphore):
+    """Starts catch_up_channel for a newly acquired channel unless one is already running."""
+    target_channel = config['channel_username']
+    if target_channel in _catch_up_tasks:
+        return
+    task = asyncio.create_task(catch_up_channel(config, semaphore))
+    _catch_up_tasks[target_channel] = task
+    task.add_done_callback(lambda _: _catch_up_tasks.pop(target_channel, None))
+
+
+def buffer_pushed_messages(config, messages, delay=EVENT_SETTLE_SECONDS):
+    """
+    Collects messages pushed by Telegram and feeds them to the grouper after `delay`
+    seconds of quiet. While a group is still open, a follow-up flush is scheduled for
+    when it can no longer grow, so it is processed without waiting for a poll.
+    """
+    target_channel = config['channel_username']
+    _pending_events.setdefault(target_channel, []).extend(messages)
+
+    task = _flush_tasks.get(target_channel)
+    if task:
+        task.cancel()
+    _flush_tasks[target_channel] = asyncio.create_task(_flush_pushed_messages(config, delay))
+
+
+async def _flush_pushed_messages(config, delay):
+    target_channel = config['channel_username']
+    await asyncio.sleep(delay)
+
+    # Detach before processing so newer events start a fresh debounce instead of cancelling this one
+    _flush_tasks.pop(target_channel, None)
+    if target_channel not in _caught_up:
+        return  # Held in _pending_events; catch_up_channel flushes them once it is done
+    msgs = _pending_events.pop(target_channel, [])
+
+    if msgs:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Pushed: {target_channel} ({len(msgs)} messages)")
+    try:
+        with profiler.cycle("events"):
+            await process_messages(config, msgs)
+    except Exception as e:
+        print(f"  [Error processing {target_channel}] {e}")
+
+    if grouper.open_group(target_channel) and target_channel not in _flush_tasks:
+        buffer_pushed_messages(config, [], delay=MAX_TIME_DIFF_SECONDS + 1)
+
+
+async def run_events():
+    """
+    Event-driven ingestion: subscribes to NewMessage/Album updates for every configured
+    channel and handles the ones this worker owns. Each channel is caught up when its
+    lease is acquired, covering anything posted while nobody was listening.
+    """
+    configs_by_peer = {}
+    for config in CHANNELS_CONFIG:
+        entity = await get_channel_entity(config['channel_username'])
+        configs_by_peer[utils.get_peer_id(entity)] = config
+    chats = list(configs_by_peer)
+
+    async def on_new_message(event):
+        if event.message.grouped_id:
+            return  # Delivered as a whole by the Album handler
+        config = configs_by_peer.get(event.chat_id)
+        if config and coordinator.owns(config['channel_username']):
+            buffer_pushed_messages(config, [event.message])
+
+    async def on_album(event):
+        config = configs_by_peer.get(event.chat_id)
+        if config and coordinator.owns(config['channel_username']):
+            buffer_pushed_messages(config, list(event.messages))
+
+    pipeline = start_pipeline()
+    profiler.install_signal_handler()
+    client.add_event_handler(on_new_message, events.NewMessage(chats=chats))
+    client.add_event_handler(on_album, events.Album(chats=chats))
+
+    # Catch-up polls start only after subscribing, so nothing falls between the two
+    semaphore = asyncio.Semaphore(CHANNEL_CONCURRENCY)
+    pipeline.append(asyncio.create_task(
+        maintain_leases(on_acquired=lambda config: start_catch_up(config, semaphore))
+    ))
+    print(f"Listening for new posts on {len(chats)} channels as {WORKER_ID}...")
+
+    await client.run_until_disconnected()
 
 
 if __name__ == '__main__':
-    with client: client.loop.run_until_complete(run_forever())
\ No newline at end of file
+    setup()
+    try:
+        with client: client.loop.run_until_complete(run_events() if INGEST_MODE == 'events' else run_forever())
+    finally:
+        coordinator.release_all()
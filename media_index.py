@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MEDIA_INDEX_PATH = os.getenv("MEDIA_INDEX_PATH", "media_index.db")  # Not used with COORDINATOR=sqlite (main.py)
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "2"))  # Hamming bits (of 64) for a candidate match
+# Candidates are confirmed on a 16x16 dHash: banners sharing a template but not the text differ by ~15 of
+# 256 bits there (and only 2 of the 64), while recompressed or resized copies differ by 0-1
+PHASH_DETAIL_MAX_DISTANCE = int(os.getenv("PHASH_DETAIL_MAX_DISTANCE", "6"))
+PHASH_BANDS = 8  # 8 x 8-bit bands: any hash within 7 bits shares at least one band
+
+
+def sha256_bytes(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dhash(img: Image.Image, side: int) -> int:
+    px = img.resize((side + 1, side), Image.Resampling.BILINEAR).tobytes()
+    value = 0
+    for row in range(side):
+        for col in range(side):
+            left = px[row * (side + 1) + col]
+            right = px[row * (side + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def perceptual_hashes(data) -> Tuple[int, int]:
+    """
+    Difference hashes (dHash) of an image: 64-bit for the band index and 256-bit to
+    confirm a match. Both survive recompression, resizing and format changes, so a
+    re-encoded repost still matches the original.
+    """
+    img = Image.open(BytesIO(data))
+    if img.format == "JPEG":
+        img.draft("L", (128, 128))
+    img = img.convert("L")
+    return _dhash(img, 8), _dhash(img, 16)
+
+
+def perceptual_hash(data) -> int:
+    """64-bit dHash of an image."""
+    return perceptual_hashes(data)[0]
+
+
+def _bands(phash: int):
+    return [(i, (phash >> (i * 8)) & 0xFF) for i in range(PHASH_BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class MediaIndex:
+    """
+    Maps Telegram media ids, SHA-256 of the bytes and perceptual hashes to the Bunny
+    file_url an identical (or visually identical) image was already uploaded under.
+    A perceptual match needs both the 64-bit and the 256-bit hash to be close; images
+    indexed without the 256-bit hash only match by file id or SHA-256. With shared
+    set, several workers use the file, which then keeps a rollback journal (WAL does
+    not work on network filesystems).
+    """
+    def __init__(self, path: str = MEDIA_INDEX_PATH, max_distance: int = PHASH_MAX_DISTANCE,
+                 detail_max_distance: int = PHASH_DETAIL_MAX_DISTANCE, shared: bool = False):
+        self.path = path
+        self.max_distance = max_distance
+        self.detail_max_distance = detail_max_distance
+        self.hits = {"file_id": 0, "sha256": 0, "phash": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30 if shared else 5)
+        self._conn.execute("PRAGMA journal_mode=DELETE" if shared else "PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS media (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_url TEXT NOT NULL,
+                sha256 TEXT,
+                phash INTEGER,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256);
+            CREATE TABLE IF NOT EXISTS media_file_ids (
+                tg_file_id TEXT PRIMARY KEY,
+                media_id INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS media_phash_bands (
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                media_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS media_phash_band_lookup ON media_phash_bands (band, value);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(media)")}
+        if "phash_detail" not in columns:  # Indexes created before matches were confirmed
+            self._conn.execute("ALTER TABLE media ADD COLUMN phash_detail TEXT")
+        self._conn.commit()
+
+    def lookup_file_id(self, tg_file_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT m.file_url FROM media_file_ids f JOIN media m ON m.id = f.media_id WHERE f.tg_file_id = ?",
+                (tg_file_id,),
+            ).fetchone()
+        if row:
+            self.hits["file_id"] += 1
+        return row[0] if row else None
+
+    def lookup_sha256(self, sha256: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT file_url FROM media WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+        if row:
+            self.hits["sha256"] += 1
+        return row[0] if row else None
+
+    def lookup_phash(self, phash: int, detail: int) -> Optional[str]:
+        """
+        Closest indexed image within max_distance bits, found through the band index and
+        confirmed by the 256-bit hash being within detail_max_distance bits.
+        """
+        clauses = " OR ".join("(band = ? AND value = ?)" for _ in range(PHASH_BANDS))
+        params = [x for pair in _bands(phash) for x in pair]
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT m.file_url, m.phash, m.phash_detail FROM media m WHERE m.phash_detail IS NOT NULL AND m.id IN (
+                    SELECT media_id FROM media_phash_bands WHERE {clauses}
+                )
+                """,
+                params,
+            ).fetchall()
+
+        best = None
+        for file_url, stored, stored_detail in rows:
+            distance = bin((stored & 0xFFFFFFFFFFFFFFFF) ^ phash).count("1")
+            if distance > self.max_distance or bin(int(stored_detail, 16) ^ detail).count("1") > self.detail_max_distance:
+                continue
+            if best is None or distance < best[0]:
+                best = (distance, file_url)
+        if best:
+            self.hits["phash"] += 1
+        return best[1] if best else None
+
+    def add(self, file_url: str, tg_file_id: Optional[str] = None, sha256: Optional[str] = None,
+            phash: Optional[int] = None, detail: Optional[int] = None) -> None:
+        """Records an uploaded (or reused) file under every key we know for it."""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM media WHERE file_url = ? LIMIT 1", (file_url,)).fetchone()
+            if row:
+                media_id = row[0]
+            else:
+                cur = self._conn.execute(
+                    "INSERT INTO media (file_url, sha256, phash, phash_detail, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (file_url, sha256, _to_signed(phash) if phash is not None else None,
+                     f"{detail:064x}" if detail is not None else None, time.time()),
+                )
+                media_id = cur.lastrowid
+                if phash is not None:
+                    self._conn.executemany(
+                        "INSERT INTO media_phash_bands (band, value, media_id) VALUES (?, ?, ?)",
+                        [(band, value, media_id) for band, value in _bands(phash)],
+                    )
+            if tg_file_id:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO media_file_ids (tg_file_id, media_id) VALUES (?, ?)",
+                    (tg_file_id, media_id),
+                )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,75 @@
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from telethon.tl import types
+
+load_dotenv()
+
+PHOTO_TARGET_SIDE = int(os.getenv("PHOTO_TARGET_SIDE", "1280"))  # Longest side we actually publish
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))  # Images sent as files
+MAX_DOCUMENT_BYTES = int(os.getenv("MAX_DOCUMENT_BYTES", str(10 * 1024 * 1024)))  # Bunny upload limit
+SKIP_MIME_PREFIXES = tuple(
+    p.strip() for p in os.getenv("SKIP_MIME_PREFIXES", "video/,audio/").split(",") if p.strip()
+)
+
+
+class MediaDecision:
+    """
+    action: "download" or "skip"
+    thumb: type of the photo size to request, e.g. 'x' (None = Telethon's default, i.e. the largest).
+           A type string rather than the size object: Telethon ignores PhotoSizeProgressive objects
+    expected_bytes: size Telegram reports for what will be transferred, when known
+    """
+    def __init__(self, action: str, thumb=None, reason: str = "", expected_bytes: Optional[int] = None):
+        self.action = action
+        self.thumb = thumb
+        self.reason = reason
+        self.expected_bytes = expected_bytes
+
+    @property
+    def skip(self) -> bool:
+        return self.action == "skip"
+
+
+def _size_bytes(size) -> int:
+    if isinstance(size, types.PhotoSizeProgressive):
+        return max(size.sizes) if size.sizes else 0
+    return getattr(size, "size", 0) or 0
+
+
+def select_photo_size(photo, target_side: int = PHOTO_TARGET_SIDE):
+    """
+    Smallest downloadable size whose longest side still reaches target_side;
+    the largest one when none does.
+    """
+    sizes = [s for s in photo.sizes if isinstance(s, (types.PhotoSize, types.PhotoSizeProgressive))]
+    if not sizes:
+        return None
+    big_enough = [s for s in sizes if max(s.w, s.h) >= target_side]
+    if big_enough:
+        return min(big_enough, key=lambda s: s.w * s.h)
+    return max(sizes, key=lambda s: s.w * s.h)
+
+
+def select_media(msg) -> MediaDecision:
+    """Decides what (if anything) to download for a message using only the metadata Telethon already has."""
+    if msg.photo:
+        size = select_photo_size(msg.photo)
+        if size is None:
+            return MediaDecision("skip", reason="photo has no downloadable sizes")
+        return MediaDecision("download", thumb=size.type, expected_bytes=_size_bytes(size))
+
+    if msg.document:
+        mime = msg.document.mime_type or ""
+        size = msg.document.size or 0
+        if any(mime.startswith(prefix) for prefix in SKIP_MIME_PREFIXES):
+            return MediaDecision("skip", reason=f"{mime} is not published", expected_bytes=size)
+        if mime.startswith("image/"):
+            if size > MAX_IMAGE_BYTES:
+                return MediaDecision("skip", reason=f"image of {size} bytes exceeds {MAX_IMAGE_BYTES}", expected_bytes=size)
+        elif size > MAX_DOCUMENT_BYTES:
+            return MediaDecision("skip", reason=f"document of {size} bytes exceeds {MAX_DOCUMENT_BYTES}", expected_bytes=size)
+        return MediaDecision("download", expected_bytes=size)
+
+    return MediaDecision("skip", reason="no downloadable media")
@@ -0,0 +1,178 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables the HTTP endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # 'text' or 'json'
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    """A value that can go up and down (set() replaces it)."""
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels) -> None:
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+    def render(self) -> str:
+        return super().render().replace(f"# TYPE {self.name} counter", f"# TYPE {self.name} gauge", 1)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, list] = {}  # key -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[LabelKey, Tuple[int, float]]:
+        """(count, sum) per label set, for diffing two points in time."""
+        with self._lock:
+            return {key: (series[-2], series[-1]) for key, series in self._series.items()}
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:.6f}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram("scraper_stage_seconds", "Latency of each pipeline stage")
+STAGE_ERRORS = Counter("scraper_stage_errors_total", "Failed stage executions")
+MESSAGES = Counter("scraper_messages_total", "Telegram messages fetched")
+GROUPS = Counter("scraper_groups_total", "Message groups queued for processing")
+SKIPS = Counter("scraper_skips_total", "Groups or media skipped, by reason")
+AI_CALLS = Counter("scraper_ai_calls_total", "Gemini calls, by result (cached, requested, retried, failed)")
+BYTES_DOWNLOADED = Counter("scraper_bytes_downloaded_total", "Media bytes downloaded from Telegram")
+BYTES_UPLOADED = Counter("scraper_bytes_uploaded_total", "Bytes uploaded to Bunny")
+POSTS_PUBLISHED = Counter("scraper_posts_published_total", "Posts published to the API")
+POLL_INTERVAL = Gauge("scraper_poll_interval_seconds", "Current poll interval chosen for each channel")
+
+REGISTRY = [STAGE_SECONDS, STAGE_ERRORS, MESSAGES, GROUPS, SKIPS, AI_CALLS, BYTES_DOWNLOADED, BYTES_UPLOADED,
+            POSTS_PUBLISHED, POLL_INTERVAL]
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Times a stage and counts it as an error when the block raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, asyncio.CancelledError):
+            STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def render_metrics() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+def log_event(event: str, text: str, **fields) -> None:
+    """Prints the usual text line, or one JSON object per line when LOG_FORMAT=json."""
+    if LOG_FORMAT == "json":
+        record = {"ts": datetime.now(timezone.utc).isoformat(), "event": event, **fields}
+        print(json.dumps(record, ensure_ascii=False, default=str))
+    else:
+        print(text)
+
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # Headers are not needed
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+            status, body = "200 OK", render_metrics().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[asyncio.AbstractServer]:
+    """Serves the Prometheus text format on http://host:port/metrics; does nothing when port is 0."""
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle_request, host, port)
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
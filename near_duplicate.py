@@ -0,0 +1,241 @@
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from slug import transliterate_amharic
+
+load_dotenv()
+
+NEAR_DUP_PATH = os.getenv("NEAR_DUP_PATH", "near_duplicates.db")  # Not used with COORDINATOR=sqlite (main.py)
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.75"))  # Estimated Jaccard similarity of shingles
+NEAR_DUP_WINDOW_HOURS = float(os.getenv("NEAR_DUP_WINDOW_HOURS", "72"))  # Only posts this close in time match
+SHINGLE_SIZE = 5  # Characters per shingle; words are too coarse for agglutinative Amharic
+SIGNATURE_SIZE = 64  # Buckets per signature (a power of two)
+BANDS = 16  # 16 bands x 4 rows: candidates from roughly 0.5 similarity, verified against the threshold
+ROWS = SIGNATURE_SIZE // BANDS
+
+_BUCKET_BITS = SIGNATURE_SIZE.bit_length() - 1
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15  # Offsets borrowed values so densified buckets stay distinct per distance
+_URL = re.compile(r"https?://\S+|www\.\S+|@\w+|#\w+")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_NUMBER = re.compile(r"[0-9\u1369-\u137C]+")  # Arabic and Ethiopic digits
+
+
+def normalize(text: str) -> str:
+    """
+    Script-independent form of a post: Ethiopic is transliterated (which also folds
+    homophone letters such as ሀ/ሐ/ኀ and ሰ/ሠ together), links, mentions and
+    punctuation are dropped and whitespace is collapsed.
+    """
+    text = _URL.sub(" ", text)
+    return _NON_WORD.sub(" ", transliterate_amharic(text).lower()).strip()
+
+
+def numbers(text: str) -> str:
+    """
+    Distinct numbers in the post, sorted and space-separated. Posts that differ only in
+    a score, a date or a casualty count share nearly all shingles, so a match also
+    requires the same numbers.
+    """
+    return " ".join(sorted(set(_NUMBER.findall(_URL.sub(" ", text)))))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Distinct character shingles of the normalized text."""
+    normalized = normalize(text)
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash(text: str) -> Optional[Tuple[int, ...]]:
+    """
+    MinHash signature of the text's shingles (None for empty text).
+
+    Uses one-permutation hashing: every shingle is hashed once, the low bits pick a
+    bucket and each bucket keeps its minimum, instead of SIGNATURE_SIZE separate hash
+    functions per shingle. Empty buckets borrow from the next filled one (rotation
+    densification), so short posts still get a full, comparable signature.
+    """
+    values = shingles(text)
+    if not values:
+        return None
+    buckets = [None] * SIGNATURE_SIZE
+    for sh in values:
+        h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "little")
+        b, v = h & (SIGNATURE_SIZE - 1), h >> _BUCKET_BITS
+        if buckets[b] is None or v < buckets[b]:
+            buckets[b] = v
+
+    signature = []
+    for i in range(SIGNATURE_SIZE):
+        distance = 0
+        while buckets[(i + distance) % SIGNATURE_SIZE] is None:
+            distance += 1
+        signature.append((buckets[(i + distance) % SIGNATURE_SIZE] + distance * _GOLDEN) & _MASK64)
+    return tuple(signature)
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity: the share of matching signature positions."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _band_hashes(signature: Tuple[int, ...]) -> List[int]:
+    return [zlib.crc32(struct.pack(f"<{ROWS}Q", *signature[b * ROWS:(b + 1) * ROWS])) for b in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of recent posts across all channels, backed by SQLite.
+
+    posts: post id, channel, MinHash signature, numbers, the post's own timestamp and
+           whether it was published
+    bands: LSH band hashes pointing at posts, so a lookup only compares the few posts
+           that share at least one band instead of the whole window
+    links: groups that were recognised as copies of an indexed post
+
+    A post only matches a published post of another channel with the same numbers,
+    within NEAR_DUP_WINDOW_HOURS of each other (by post time, so backfills compare
+    against their own era); prune() drops older entries. A channel's follow-ups and
+    copies of posts that were rejected or failed are therefore never suppressed.
+
+    shared: workers owning different channels use the file, so it keeps a rollback
+            journal (WAL does not work on network filesystems)
+    """
+    def __init__(self, path: str = NEAR_DUP_PATH, threshold: float = NEAR_DUP_THRESHOLD,
+                 window_hours: float = NEAR_DUP_WINDOW_HOURS, shared: bool = False):
+        self.path = path
+        self.threshold = threshold
+        self.window_seconds = window_hours * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30 if shared else 5)
+        if shared:
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id TEXT PRIMARY KEY,
+                channel TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                posted_at REAL NOT NULL,
+                numbers TEXT NOT NULL DEFAULT '',
+                published INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS posts_posted_at ON posts (posted_at);
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                hash INTEGER NOT NULL,
+                post_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, hash);
+            CREATE INDEX IF NOT EXISTS bands_post ON bands (post_id);
+            CREATE TABLE IF NOT EXISTS links (
+                channel TEXT NOT NULL,
+                group_key TEXT NOT NULL,
+                duplicate_of TEXT NOT NULL,
+                similarity REAL NOT NULL,
+                linked_at REAL NOT NULL,
+                PRIMARY KEY (channel, group_key)
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(posts)")}
+        if "published" not in columns:  # Indexes created before matches required a published original
+            self._conn.execute("ALTER TABLE posts ADD COLUMN numbers TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("ALTER TABLE posts ADD COLUMN published INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+        self.hits = 0
+        self.checks = 0
+
+    def find(self, signature: Optional[Tuple[int, ...]], posted_at: float, channel: str,
+             nums: str) -> Optional[Tuple[str, float]]:
+        """
+        Best published post of another channel with the same numbers, at or above the
+        threshold within the window, as (post_id, similarity).
+        """
+        if signature is None:
+            return None
+        self.checks += 1
+        hashes = _band_hashes(signature)
+        clause = " OR ".join("(b.band = ? AND b.hash = ?)" for _ in hashes)
+        params = [v for band, h in enumerate(hashes) for v in (band, h)]
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT DISTINCT p.post_id, p.signature FROM bands b JOIN posts p ON p.post_id = b.post_id
+                WHERE ({clause}) AND p.posted_at BETWEEN ? AND ?
+                  AND p.published = 1 AND p.channel != ? AND p.numbers = ?
+                """,
+                (*params, posted_at - self.window_seconds, posted_at + self.window_seconds, channel, nums),
+            ).fetchall()
+
+        best = None
+        for post_id, blob in rows:
+            score = similarity(signature, struct.unpack(f"<{SIGNATURE_SIZE}Q", blob))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (post_id, score)
+        if best:
+            self.hits += 1
+        return best
+
+    def add(self, post_id: str, channel: str, signature: Optional[Tuple[int, ...]], posted_at: float,
+            nums: str = "") -> None:
+        """Indexes a queued post; it only starts matching once mark_published() is called."""
+        if signature is None:
+            return
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO posts (post_id, channel, signature, posted_at, numbers) VALUES (?, ?, ?, ?, ?)",
+                (post_id, channel, struct.pack(f"<{SIGNATURE_SIZE}Q", *signature), posted_at, nums),
+            )
+            if cur.rowcount:
+                self._conn.executemany(
+                    "INSERT INTO bands (band, hash, post_id) VALUES (?, ?, ?)",
+                    [(band, h, post_id) for band, h in enumerate(_band_hashes(signature))],
+                )
+            self._conn.commit()
+
+    def mark_published(self, post_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE posts SET published = 1 WHERE post_id = ?", (post_id,))
+            self._conn.commit()
+
+    def link(self, channel: str, group_key: str, duplicate_of: str, score: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO links (channel, group_key, duplicate_of, similarity, linked_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (channel, group_key, duplicate_of, score, time.time()),
+            )
+            self._conn.commit()
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drops posts (and their bands) that can no longer match anything new."""
+        cutoff = (now or time.time()) - self.window_seconds
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM bands WHERE post_id IN (SELECT post_id FROM posts WHERE posted_at < ?)", (cutoff,)
+            )
+            cur = self._conn.execute("DELETE FROM posts WHERE posted_at < ?", (cutoff,))
+            self._conn.commit()
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        return {"checks": self.checks, "duplicates": self.hits}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,169 @@
+import heapq
+import itertools
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import POLL_INTERVAL
+
+load_dotenv()
+
+POLL_MIN_INTERVAL_SECONDS = float(os.getenv("POLL_MIN_INTERVAL_SECONDS", "60"))
+POLL_MAX_INTERVAL_SECONDS = float(os.getenv("POLL_MAX_INTERVAL_SECONDS", "3600"))
+POLL_INITIAL_INTERVAL_SECONDS = float(os.getenv("POLL_INITIAL_INTERVAL_SECONDS", "600"))  # Until a rate is known
+POLL_TARGET_MESSAGES = float(os.getenv("POLL_TARGET_MESSAGES", "1"))  # Messages we aim to find per poll
+POLL_RATE_HALF_LIFE_HOURS = float(os.getenv("POLL_RATE_HALF_LIFE_HOURS", "24"))  # Memory of the posting rate
+POLL_IDLE_BACKOFF = float(os.getenv("POLL_IDLE_BACKOFF", "1.5"))  # Interval factor per consecutive empty poll
+
+
+class ChannelSchedule:
+    """Learned posting rate and polling state of one channel."""
+    def __init__(self, channel: str, interval: float, next_due: float):
+        self.channel = channel
+        self.rate = 0.0  # Messages per second, exponentially decayed
+        self.rate_updated = None  # Timestamp the rate was last decayed to
+        self.observed_since = None  # Start of the observed history (bias correction while it is short)
+        self.last_message_at = None
+        self.interval = interval
+        self.next_due = next_due
+        self.idle_polls = 0
+        self.polls = 0
+
+
+class PollScheduler:
+    """
+    Decides when each channel is polled next.
+
+    Every message timestamp feeds an exponentially decayed posting rate (half-life
+    POLL_RATE_HALF_LIFE_HOURS), and a channel is polled about as often as it takes to
+    publish POLL_TARGET_MESSAGES messages, within [min_interval, max_interval]. Each
+    consecutive empty poll multiplies the interval by POLL_IDLE_BACKOFF, so quiet
+    channels cost fewer Telegram requests. Due times live in a heap, so finding the next
+    channel is O(log n) regardless of how many channels are configured.
+    """
+    def __init__(self, min_interval: float = POLL_MIN_INTERVAL_SECONDS, max_interval: float = POLL_MAX_INTERVAL_SECONDS,
+                 initial_interval: float = POLL_INITIAL_INTERVAL_SECONDS, target_messages: float = POLL_TARGET_MESSAGES,
+                 half_life_hours: float = POLL_RATE_HALF_LIFE_HOURS, idle_backoff: float = POLL_IDLE_BACKOFF):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.initial_interval = min(self.max_interval, max(min_interval, initial_interval))
+        self.target_messages = target_messages
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.idle_backoff = idle_backoff
+        self._channels: Dict[str, ChannelSchedule] = {}
+        self._heap = []  # (next_due, seq, channel); stale entries are skipped on pop
+        self._seq = itertools.count()
+
+    def sync(self, channels: Iterable[str], now: Optional[float] = None) -> None:
+        """Tracks exactly `channels` (e.g. the ones this worker owns); new ones are due right away."""
+        now = time.time() if now is None else now
+        channels = set(channels)
+        for channel in list(self._channels):
+            if channel not in channels:
+                del self._channels[channel]
+                POLL_INTERVAL.remove(channel=channel)
+        for channel in channels - set(self._channels):
+            self._channels[channel] = ChannelSchedule(channel, self.initial_interval, now)
+            self._push(self._channels[channel])
+
+    def _push(self, sched: ChannelSchedule) -> None:
+        heapq.heappush(self._heap, (sched.next_due, next(self._seq), sched.channel))
+        POLL_INTERVAL.set(sched.interval, channel=sched.channel)
+
+    def _live(self, entry) -> bool:
+        due, _, channel = entry
+        sched = self._channels.get(channel)
+        return sched is not None and sched.next_due == due
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Channels whose poll is due; each is rescheduled by the following record()."""
+        now = time.time() if now is None else now
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._live(entry):
+                ready.append(entry[2])
+        return ready
+
+    def next_due_in(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the next poll is due (None when no channel is tracked)."""
+        now = time.time() if now is None else now
+        while self._heap and not self._live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return max(0.0, self._heap[0][0] - now) if self._heap else None
+
+    def _decay(self, sched: ChannelSchedule, until: float) -> None:
+        if sched.rate_updated is not None and until > sched.rate_updated:
+            sched.rate *= math.exp(-(until - sched.rate_updated) / self.tau)
+        sched.rate_updated = until if sched.rate_updated is None else max(sched.rate_updated, until)
+
+    def record(self, channel: str, timestamps: Optional[Iterable] = None, now: Optional[float] = None,
+               recheck_in: Optional[float] = None) -> Optional[float]:
+        """
+        Learns from a finished poll and schedules the next one; returns the new interval.
+
+        timestamps: dates (datetime or epoch seconds) of the messages the poll returned,
+                    or None when the poll failed, which keeps the current interval
+        recheck_in: poll again no later than this, e.g. to close a group that is still open
+        """
+        now = time.time() if now is None else now
+        sched = self._channels.get(channel)
+        if sched is None:
+            return None
+        sched.polls += 1
+
+        if timestamps is not None:
+            new = sorted(t.timestamp() if isinstance(t, datetime) else float(t) for t in timestamps)
+            new = [t for t in new if sched.last_message_at is None or t > sched.last_message_at]
+            for t in new:
+                self._decay(sched, t)
+                sched.rate += 1 / self.tau
+            self._decay(sched, now)
+            start = min(new[0], now) if new else now
+            sched.observed_since = start if sched.observed_since is None else min(sched.observed_since, start)
+            if new:
+                sched.last_message_at = new[-1]
+                sched.idle_polls = 0
+            else:
+                sched.idle_polls += 1
+            sched.interval = self._interval(sched)
+
+        delay = sched.interval if recheck_in is None else min(sched.interval, max(self.min_interval, recheck_in))
+        sched.next_due = now + delay
+        self._push(sched)
+        return sched.interval
+
+    def _rate(self, sched: ChannelSchedule, now: float) -> float:
+        """
+        Messages per second. The decayed sum only reaches the true rate after a few
+        half-lives, so it is divided by the weight of the history observed so far.
+        """
+        if not sched.rate or sched.observed_since is None:
+            return 0.0
+        weight = 1 - math.exp(-max(now - sched.observed_since, self.min_interval) / self.tau)
+        return sched.rate / weight
+
+    def _interval(self, sched: ChannelSchedule) -> float:
+        rate = self._rate(sched, sched.rate_updated)
+        base = self.target_messages / rate if rate > 0 else self.max_interval
+        if sched.last_message_at is None:
+            base = min(base, self.initial_interval)  # Nothing seen yet: no evidence the channel is quiet
+        base *= self.idle_backoff ** sched.idle_polls
+        return min(self.max_interval, max(self.min_interval, base))
+
+    def intervals(self, now: Optional[float] = None) -> Dict[str, dict]:
+        """Chosen interval, learned rate and time to the next poll per channel, for logs and debugging."""
+        now = time.time() if now is None else now
+        return {
+            c: {
+                "interval_s": round(s.interval, 1),
+                "posts_per_hour": round(self._rate(s, s.rate_updated or now) * 3600, 3),
+                "idle_polls": s.idle_polls,
+                "next_poll_in_s": round(max(0.0, s.next_due - now), 1),
+            }
+            for c, s in sorted(self._channels.items())
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import STAGE_SECONDS
+
+load_dotenv()
+
+PROFILE_CYCLES = int(os.getenv("PROFILE_CYCLES", "0"))  # Profile this many cycles from startup (0: only on SIGUSR1)
+PROFILE_SIGNAL_CYCLES = int(os.getenv("PROFILE_SIGNAL_CYCLES", "3"))  # Cycles profiled after each SIGUSR1
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "30"))  # Rows per report section
+PROFILE_TRACE_FRAMES = int(os.getenv("PROFILE_TRACE_FRAMES", "10"))  # Stack depth kept per allocation
+
+_TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _task_name(task: asyncio.Task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or type(coro).__name__
+
+
+class CycleProfiler:
+    """
+    Profiles a number of scraper cycles on demand, then switches itself off.
+
+    While armed, every cycle() records a cProfile of everything the event loop ran
+    (stage workers included), the per-stage time from the STAGE_SECONDS histogram,
+    the live asyncio tasks by coroutine, and a tracemalloc diff against the previous
+    cycle, which is where growth from retained messages or image buffers shows up.
+    Each cycle is written to PROFILE_DIR as a text report plus a .prof file for
+    pstats/snakeviz. Nothing is traced while it is idle.
+    """
+    def __init__(self, cycles: int = PROFILE_CYCLES, directory: str = PROFILE_DIR, top: int = PROFILE_TOP):
+        self.directory = directory
+        self.top = top
+        self.remaining = cycles
+        self.reports: List[str] = []
+        self._cycle = 0
+        self._started_tracing = False
+        self._running = False
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def active(self) -> bool:
+        return self.remaining > 0
+
+    def request(self, cycles: int = PROFILE_SIGNAL_CYCLES) -> None:
+        """Arms the profiler for the next `cycles` cycles."""
+        self.remaining = max(self.remaining, cycles)
+        print(f"[PROFILE] Profiling the next {self.remaining} cycles into {self.directory}/")
+
+    def install_signal_handler(self, sig: int = getattr(signal, "SIGUSR1", 0)) -> bool:
+        """Arms the profiler when `sig` arrives (kill -USR1 <pid>); must be called inside the running loop."""
+        if not sig:
+            return False  # No SIGUSR1 on Windows
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, self.request)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
+    @contextmanager
+    def cycle(self, label: str = "cycle"):
+        """Profiles the enclosed block when armed; a no-op otherwise or inside another profiled cycle."""
+        if not self.active or self._running:
+            yield
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+            self._started_tracing = True
+            self._previous = None
+        if self._previous is None:
+            self._previous = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+
+        self._cycle += 1
+        self._running = True
+        stages_before = STAGE_SECONDS.snapshot()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._running = False
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+            try:
+                self._write_report(label, elapsed, profile, stages_before, snapshot)
+            except OSError as e:
+                print(f"[PROFILE] Could not write report: {e}")
+            self._previous = snapshot
+            self.remaining -= 1
+            if not self.active:
+                self._finish()
+
+    def _finish(self) -> None:
+        self._previous = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        print("[PROFILE] Profiling finished")
+
+    def _write_report(self, label, elapsed, profile, stages_before, snapshot) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stem = os.path.join(self.directory, f"{label}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self._cycle}")
+        profile.dump_stats(f"{stem}.prof")
+
+        out = io.StringIO()
+        current, peak = tracemalloc.get_traced_memory()
+        out.write(f"{label} {self._cycle}: {elapsed:.3f}s wall, traced memory {current / 1024 / 1024:.1f} MB "
+                  f"(peak {peak / 1024 / 1024:.1f} MB)\n")
+
+        out.write("\n== Stage time during this cycle ==\n")
+        out.write(f"{'stage':<14}{'calls':>8}{'total s':>12}{'mean ms':>12}\n")
+        for key, (count, total) in sorted(STAGE_SECONDS.snapshot().items()):
+            prev_count, prev_total = stages_before.get(key, (0, 0.0))
+            calls, seconds = count - prev_count, total - prev_total
+            if calls:
+                stage = dict(key).get("stage", "?")
+                out.write(f"{stage:<14}{calls:>8}{seconds:>12.3f}{seconds / calls * 1000:>12.1f}\n")
+
+        try:
+            tasks = Counter(_task_name(t) for t in asyncio.all_tasks())
+        except RuntimeError:
+            tasks = Counter()  # Not inside a running loop
+        out.write(f"\n== Live asyncio tasks ({sum(tasks.values())}) ==\n")
+        for name, count in tasks.most_common(self.top):
+            out.write(f"{count:>6}  {name}\n")
+
+        out.write(f"\n== Allocation growth since the previous cycle (top {self.top}) ==\n")
+        for stat in snapshot.compare_to(self._previous, "lineno")[:self.top]:
+            out.write(f"{stat}\n")
+
+        out.write(f"\n== CPU profile by cumulative time (top {self.top}) ==\n")
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+
+        with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        self.reports.append(f"{stem}.txt")
+        print(f"[PROFILE] {label} {self._cycle} took {elapsed:.1f}s; report written to {stem}.txt")
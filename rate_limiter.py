@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))  # Requests per minute across the whole process
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))  # Estimated tokens per minute
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2"))  # Seconds before the first retry
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "60"))
+
+# Lower runs first: relevance decides whether anything else is spent on a post
+PRIORITY_CLASSIFY = 0
+PRIORITY_TITLE = 1
+PRIORITY_TRANSLATE = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count; Ethiopic script tokenizes denser than Latin text."""
+    ethiopic = sum(1 for ch in text if "\u1200" <= ch <= "\u137f")
+    return max(1, (len(text) - ethiopic) // 4 + ethiopic // 2)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Retry-After when the server sent one, else full-jitter exponential backoff."""
+    if retry_after is not None:
+        return min(GEMINI_BACKOFF_MAX, max(0.0, retry_after))
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)  # A single oversized request still gets through eventually
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Process-wide requests/tokens-per-minute budget for Gemini.
+
+    Callers await acquire(); waiting requests are granted strictly by priority
+    (then arrival order), so a backlog of translations never delays relevance checks.
+    pause() stops every caller, e.g. after a 429 with Retry-After.
+    """
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.waited_seconds = 0.0
+        self.granted = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, estimated_tokens: int = 1, priority: int = PRIORITY_TRANSLATE) -> None:
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), estimated_tokens, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        finally:
+            self.waited_seconds += time.monotonic() - start
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            priority, seq, estimated, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            delay = max(
+                self.paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(estimated),
+            )
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(estimated)
+            self.granted += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "granted": self.granted,
+            "queued": len(self._waiters),
+            "waited_seconds": round(self.waited_seconds, 1),
+        }
+
+
+_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,253 @@
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RELEVANCE_DB_PATH = os.getenv("RELEVANCE_DB_PATH", "relevance.db")
+RELEVANCE_LOW = float(os.getenv("RELEVANCE_LOW", "0.05"))  # At or below: skip without asking Gemini
+RELEVANCE_HIGH = float(os.getenv("RELEVANCE_HIGH", "0.95"))  # At or above: relevant without asking Gemini
+RELEVANCE_AUDIT_RATE = float(os.getenv("RELEVANCE_AUDIT_RATE", "0.05"))  # Share of confident verdicts checked by Gemini
+MIN_TRAINING_EXAMPLES = int(os.getenv("RELEVANCE_MIN_TRAINING_EXAMPLES", "50"))
+RELEVANCE_MAX_EXAMPLES = int(os.getenv("RELEVANCE_MAX_EXAMPLES", "5000"))  # Oldest examples are dropped beyond this
+RETRAIN_EVERY = 25  # New examples between weight updates
+MIN_FEATURE_COUNT = 3  # Features seen fewer times than this are ignored by training
+
+AMHARIC_PATTERN = re.compile(r'[\u1200-\u137F]')
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u1200-\u135A]+")
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+
+# Hand-picked starting weights; training on past Gemini decisions adjusts them.
+# Amharic entries are matched as substrings of words (prefixes like የ/በ/ለ and suffixes vary).
+SEED_WEIGHTS: Dict[str, float] = {
+    # English - trade and economy
+    "export": 2.5, "exports": 2.5, "exporters": 2.5, "coffee": 1.5, "tea": 1.0, "sesame": 1.5,
+    "oilseeds": 1.5, "pulses": 1.0, "livestock": 1.0, "trade": 1.5, "market": 1.0, "logistics": 2.0,
+    "shipment": 1.5, "customs": 1.5, "tariff": 1.5, "port": 1.0, "djibouti": 1.0, "corridor": 1.0,
+    "revenue": 1.5, "investment": 1.0, "economy": 1.5, "economic": 1.5, "price": 1.0, "tons": 1.0,
+    "usd": 1.5, "dollar": 1.0, "foreign": 0.5, "currency": 1.0, "certification": 1.0, "quality": 0.5,
+    # English - greetings and internal notices
+    "congratulations": -2.0, "happy": -1.5, "holiday": -2.0, "condolence": -3.0, "condolences": -3.0,
+    "birthday": -2.5, "vacancy": -2.0, "staff": -1.0, "employees": -1.0, "wishes": -1.5,
+    # Amharic - trade and economy
+    "ኤክስፖርት": 2.5, "ወጪንግድ": 2.5, "ቡና": 1.5, "ሻይ": 1.0, "ሰሊጥ": 1.5, "ቅመማ": 1.0, "ንግድ": 1.5,
+    "ገበያ": 1.0, "ሎጂስቲክስ": 2.0, "ጉምሩክ": 1.5, "ኢንቨስትመንት": 1.0, "ኢኮኖሚ": 1.5, "ዋጋ": 1.0,
+    "ምንዛሪ": 1.5, "ዶላር": 1.5, "ቶን": 1.0, "ምርት": 0.5, "ጥራት": 0.5, "ወደብ": 1.0,
+    # Amharic - greetings and internal notices
+    "እንኳን": -1.5, "አደረሳችሁ": -2.5, "በዓል": -2.0, "መልካም": -1.0, "ሀዘን": -3.0, "ሐዘን": -3.0,
+    "ልደት": -1.5, "ሰራተኞች": -1.0, "ምስጋና": -1.0,
+}
+
+AMHARIC_SEEDS = [k for k in SEED_WEIGHTS if AMHARIC_PATTERN.search(k)]
+
+
+def is_amharic(text):
+    return bool(AMHARIC_PATTERN.search(text))
+
+
+def extract_features(text: str) -> Set[str]:
+    """
+    Binary features of a post: lowercased English words and bigrams, Amharic words,
+    and Amharic character trigrams so that affixed forms still share features.
+    """
+    text = URL_PATTERN.sub(" ", text.lower())
+    tokens = TOKEN_PATTERN.findall(text)
+    features = set(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    for tok in tokens:
+        if is_amharic(tok) and len(tok) > 3:
+            features.update(f"#{tok[i:i + 3]}" for i in range(len(tok) - 2))
+    return features
+
+
+class RelevanceScorer:
+    """
+    Offline pre-filter in front of the Gemini relevance check.
+
+    Scores posts with a weighted Amharic+English keyword/n-gram model. Only posts whose
+    probability falls between `low` and `high` are sent to Gemini; Gemini's answers are
+    stored as training examples and periodically folded into the weights (naive Bayes
+    log-odds on top of SEED_WEIGHTS). Feature counts are kept in memory and updated per
+    example, so a retrain never re-reads the table; only the newest `max_examples`
+    examples are kept, which also lets the model follow changes in what gets posted.
+
+    Naive Bayes over many overlapping n-grams is overconfident, so a random
+    `audit_rate` share of the confident verdicts is sent to Gemini as well
+    (should_audit/record_audit); stats() reports how often those verdicts were right,
+    which is what tells whether the low/high cut-offs can be trusted.
+    """
+    def __init__(self, path: str = RELEVANCE_DB_PATH, low: float = RELEVANCE_LOW, high: float = RELEVANCE_HIGH,
+                 audit_rate: float = RELEVANCE_AUDIT_RATE, max_examples: int = RELEVANCE_MAX_EXAMPLES):
+        self.path = path
+        self.low = low
+        self.high = high
+        self.audit_rate = audit_rate
+        self.max_examples = max_examples
+        self.weights: Dict[str, float] = dict(SEED_WEIGHTS)
+        self.bias = 0.0
+        self.skipped_irrelevant = 0
+        self.accepted_relevant = 0
+        self.uncertain = 0
+        self.compared = 0
+        self.agreed = 0
+        self.audited = {False: 0, True: 0}  # Confident verdict -> times checked against Gemini
+        self.audit_agreed = {False: 0, True: 0}
+        self._since_training = 0
+        self._pos: Counter = Counter()  # Feature -> relevant examples containing it
+        self._neg: Counter = Counter()
+        self._n = {True: 0, False: 0}  # Label -> stored examples
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS relevance_examples (
+                text TEXT PRIMARY KEY,
+                label INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS relevance_examples_created_at ON relevance_examples (created_at);
+            """
+        )
+        self._conn.commit()
+        self.train()
+
+    def probability(self, text: str) -> float:
+        features = extract_features(text)
+        compact = re.sub(r"\s+", "", text)
+        score = self.bias + sum(self.weights.get(f, 0.0) for f in features)
+        # Amharic keywords also match inside affixed words (e.g. የቡና, በኤክስፖርት)
+        for keyword in AMHARIC_SEEDS:
+            if keyword not in features and keyword in compact:
+                score += self.weights[keyword]
+        z = max(-30.0, min(30.0, score))
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def classify(self, text: str) -> Optional[bool]:
+        """True/False when the post is obviously (ir)relevant, None when Gemini should decide."""
+        p = self.probability(text)
+        if p <= self.low:
+            self.skipped_irrelevant += 1
+            return False
+        if p >= self.high:
+            self.accepted_relevant += 1
+            return True
+        self.uncertain += 1
+        return None
+
+    def should_audit(self) -> bool:
+        """Whether a confident verdict should still be checked against Gemini."""
+        return random.random() < self.audit_rate
+
+    def record_audit(self, verdict: bool, label: bool) -> None:
+        """Tracks a confident verdict against Gemini's answer for the same post."""
+        self.audited[verdict] += 1
+        if verdict == bool(label):
+            self.audit_agreed[verdict] += 1
+
+    def record(self, text: str, label: bool) -> None:
+        """Stores a Gemini decision as a training example and tracks agreement with it."""
+        self.compared += 1
+        if (self.probability(text) >= 0.5) == bool(label):
+            self.agreed += 1
+
+        text, label = text[:4000], bool(label)
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT label FROM relevance_examples WHERE text = ?", (text,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO relevance_examples (text, label, created_at) VALUES (?, ?, ?)",
+                (text, int(label), time.time()),
+            )
+            expired = []
+            excess = self._n[True] + self._n[False] + (previous is None) - self.max_examples
+            if excess > 0:
+                expired = self._conn.execute(
+                    "SELECT text, label FROM relevance_examples ORDER BY created_at LIMIT ?", (excess,)
+                ).fetchall()
+                self._conn.executemany("DELETE FROM relevance_examples WHERE text = ?", [(t,) for t, _ in expired])
+            self._conn.commit()
+
+        if previous is not None:
+            self._count(text, bool(previous[0]), -1)
+        self._count(text, label, 1)
+        for old_text, old_label in expired:
+            self._count(old_text, bool(old_label), -1)
+        self._since_training += 1
+        if self._since_training >= RETRAIN_EVERY:
+            self._fit()
+
+    def _count(self, text: str, label: bool, delta: int) -> None:
+        counts = self._pos if label else self._neg
+        for feat in extract_features(text):
+            counts[feat] += delta
+            if counts[feat] <= 0:
+                del counts[feat]
+        self._n[label] += delta
+
+    def train(self) -> None:
+        """Rebuilds the feature counts and weights from the stored examples, dropping the oldest beyond max_examples."""
+        with self._lock:
+            self._conn.execute(
+                """
+                DELETE FROM relevance_examples WHERE text NOT IN (
+                    SELECT text FROM relevance_examples ORDER BY created_at DESC LIMIT ?
+                )
+                """,
+                (self.max_examples,),
+            )
+            self._conn.commit()
+            rows = self._conn.execute("SELECT text, label FROM relevance_examples").fetchall()
+        self._pos, self._neg, self._n = Counter(), Counter(), {True: 0, False: 0}
+        for text, label in rows:
+            self._count(text, bool(label), 1)
+        self._fit()
+
+    def _fit(self) -> None:
+        """Naive Bayes weights from the current counts (seed weights only until MIN_TRAINING_EXAMPLES exist)."""
+        self._since_training = 0
+        n_pos, n_neg = self._n[True], self._n[False]
+        if n_pos + n_neg < MIN_TRAINING_EXAMPLES:
+            return
+
+        pos, neg = self._pos, self._neg
+        weights = dict(SEED_WEIGHTS)
+        for feat in set(pos) | set(neg):
+            if pos[feat] + neg[feat] < MIN_FEATURE_COUNT:
+                continue
+            log_odds = math.log((pos[feat] + 1) / (n_pos + 2)) - math.log((neg[feat] + 1) / (n_neg + 2))
+            weights[feat] = weights.get(feat, 0.0) + log_odds
+        self.weights = weights
+        self.bias = math.log((n_pos + 1) / (n_neg + 1))
+
+    def stats(self) -> dict:
+        def rate(agreed, checked):
+            return round(agreed / checked, 3) if checked else None
+
+        audited = sum(self.audited.values())
+        decided = self.skipped_irrelevant + self.accepted_relevant
+        total = decided + self.uncertain
+        return {
+            "calls_saved": decided - audited,
+            "skipped_irrelevant": self.skipped_irrelevant,
+            "accepted_relevant": self.accepted_relevant,
+            "sent_to_gemini": self.uncertain + audited,
+            "saved_rate": round((decided - audited) / total, 3) if total else 0.0,
+            "agreement_rate": rate(self.agreed, self.compared),  # Uncertain posts only
+            "audited": audited,
+            "audit_agreement_rate": rate(sum(self.audit_agreed.values()), audited),
+            "skip_precision": rate(self.audit_agreed[False], self.audited[False]),  # Share of skips Gemini agrees with
+            "accept_precision": rate(self.audit_agreed[True], self.audited[True]),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
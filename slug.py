@@ -1,5 +1,16 @@
+import os
 import re
-from typing import Dict, Iterable, Union
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SLUG_INDEX_PATH = os.getenv("SLUG_INDEX_PATH", "slug_index.db")  # Not used with COORDINATOR=sqlite (main.py)
+MAX_SLUG_LENGTH = 100
 
 amharic_to_latin_map: Dict[str, str] = {
     'ሀ': 'ha', 'ሁ': 'hu', 'ሂ': 'hi', 'ሃ': 'ha', 'ሄ': 'he', 'ህ': 'h', 'ሆ': 'ho',
@@ -38,11 +49,48 @@ amharic_to_latin_map: Dict[str, str] = {
 }
 
 
+# Syllables missing from the map are derived from their row: Ethiopic lays each consonant out
+# as 8 code points (e, u, i, a, ē, base, o, wa), so the row's base form gives the consonant.
+_VOWEL_SUFFIXES = ("e", "u", "i", "a", "e", "", "o", "wa")
+_VOWEL_ROWS = (0x12A0, 0x12D0)  # አ and ዐ rows carry the vowel alone
+_EXTRA_ROOTS = {0x1250: "q", 0x1268: "v", 0x12F8: "d", 0x1318: "g"}  # Rows not in the map
+_ETHIOPIC_DIGITS = {0x1369 + i: str(i + 1) for i in range(9)}
+_ETHIOPIC_DIGITS.update({0x1372 + i: str((i + 1) * 10) for i in range(9)})
+_ETHIOPIC_DIGITS.update({0x137B: "100", 0x137C: "10000"})
+
+
+def _build_transliteration_table() -> Dict[int, str]:
+    table = {ord(ch): latin for ch, latin in amharic_to_latin_map.items()}
+    for row in range(0x1200, 0x1360, 8):
+        if row in _VOWEL_ROWS:
+            root = ""
+        elif row in _EXTRA_ROOTS:
+            root = _EXTRA_ROOTS[row]
+        elif chr(row + 5) in amharic_to_latin_map:
+            root = amharic_to_latin_map[chr(row + 5)]
+        else:
+            continue  # Labialized rows (ቈ, ኰ, ...) use a different layout
+        for offset, vowel in enumerate(_VOWEL_SUFFIXES):
+            latin = "a" if row in _VOWEL_ROWS and offset == 7 else root + vowel
+            table.setdefault(row + offset, latin or root)
+    for cp in range(0x1360, 0x1369):
+        table[cp] = " "  # Ethiopic punctuation (፡ ። ፣ ...) separates words
+    table.update(_ETHIOPIC_DIGITS)
+    return table
+
+
+TRANSLITERATION_TABLE = _build_transliteration_table()
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_TRAILING_PART = re.compile(r"-[^-]*$")
+_VALID_SLUG = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+_NUMBERED_SLUG = re.compile(r"^(.*)-([0-9]+)$")
+
+
 def transliterate_amharic(text: str) -> str:
     """
     Transliterates Amharic text to Latin characters.
     """
-    return "".join(amharic_to_latin_map.get(ch, ch) for ch in text)
+    return text.translate(TRANSLITERATION_TABLE)
 
 
 def generate_slug(title: str, fallback_id: Union[str, int, None] = None) -> str:
@@ -50,41 +98,45 @@ def generate_slug(title: str, fallback_id: Union[str, int, None] = None) -> str:
     Generates a clean, SEO-friendly slug from a title.
     Handles Amharic text by transliterating to Latin characters.
     """
-    if not title or title.strip() == "":
-        return f"post-{fallback_id}" if fallback_id is not None else "untitled"
+    fallback = f"post-{fallback_id}" if fallback_id is not None else "untitled"
+    if not title or not title.strip():
+        return fallback
 
-    slug = transliterate_amharic(title.strip())
+    slug = _NON_ALNUM.sub("-", transliterate_amharic(title.strip()).lower()).strip("-")
 
-    slug = slug.lower()
-    slug = re.sub(r"[^a-z0-9]+", "-", slug)
-    slug = re.sub(r"^-+|-+$", "", slug)
-    slug = re.sub(r"-+", "-", slug)
+    if len(slug) > MAX_SLUG_LENGTH:
+        slug = _TRAILING_PART.sub("", slug[:MAX_SLUG_LENGTH])
 
-    if not slug:
-        return f"post-{fallback_id}" if fallback_id is not None else "untitled"
+    return slug or fallback
 
-    if len(slug) > 100:
-        slug = slug[:100]
-        slug = re.sub(r"-[^-]*$", "", slug)
 
-    if not slug:
-        return f"post-{fallback_id}" if fallback_id is not None else "untitled"
-
-    return slug
+def generate_slugs(titles: Sequence[str], fallback_ids: Optional[Sequence[Union[str, int, None]]] = None,
+                   index: Optional["SlugIndex"] = None) -> List[str]:
+    """
+    Batch version of generate_slug. With an index, every slug is also made unique
+    (reserved for the matching fallback id) in a single transaction.
+    """
+    fallback_ids = fallback_ids if fallback_ids is not None else [None] * len(titles)
+    slugs = [generate_slug(t, f) for t, f in zip(titles, fallback_ids)]
+    if index is not None:
+        slugs = index.reserve_many(slugs, owners=fallback_ids)
+    return slugs
 
 
 def is_valid_slug(slug: str) -> bool:
     """
     Validates if a slug is properly formatted.
     """
-    return bool(re.fullmatch(r"[a-z0-9]+(?:-[a-z0-9]+)*", slug))
+    return bool(_VALID_SLUG.fullmatch(slug))
 
 
 def ensure_unique_slug(base_slug: str, existing_slugs: Iterable[str]) -> str:
     """
     Ensures slug uniqueness by appending a number if needed.
+    Pass a set to avoid copying it on every call; for many slugs use SlugIndex.
     """
-    existing_slugs = set(existing_slugs)
+    if not isinstance(existing_slugs, (set, frozenset)):
+        existing_slugs = set(existing_slugs)
     slug = base_slug
     counter = 1
 
@@ -93,3 +145,113 @@ def ensure_unique_slug(base_slug: str, existing_slugs: Iterable[str]) -> str:
         counter += 1
 
     return slug
+
+
+class SlugIndex:
+    """
+    Persistent slug registry, backed by SQLite.
+
+    slugs:      every slug handed out, with the post id (owner) it belongs to
+    slug_bases: next free numeric suffix per base slug, so a taken base costs a couple of
+                lookups instead of probing -1, -2, ... against all existing slugs
+
+    Reserving again for the same owner returns the slug it already has, so retried
+    publishes keep their URL. With shared set, several workers reserve from the same
+    file, which then keeps a rollback journal (WAL does not work on network filesystems).
+    """
+    def __init__(self, path: str = SLUG_INDEX_PATH, shared: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30 if shared else 5)
+        if shared:
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS slugs (
+                slug TEXT PRIMARY KEY,
+                owner TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS slugs_owner ON slugs (owner);
+            CREATE TABLE IF NOT EXISTS slug_bases (
+                base TEXT PRIMARY KEY,
+                next_suffix INTEGER NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _reserve(self, base: str, owner: Optional[str]) -> str:
+        if owner is not None:
+            row = self._conn.execute(
+                "SELECT slug FROM slugs WHERE owner = ? AND (slug = ? OR slug LIKE ? || '-%')",
+                (owner, base, base),
+            ).fetchone()
+            if row:
+                return row[0]
+
+        taken = "SELECT 1 FROM slugs WHERE slug = ?"
+        if self._conn.execute(taken, (base,)).fetchone():
+            row = self._conn.execute("SELECT next_suffix FROM slug_bases WHERE base = ?", (base,)).fetchone()
+            suffix = max(row[0] if row else 1, 1)
+            # Only loops when another title's base already ends in the same number
+            while self._conn.execute(taken, (f"{base}-{suffix}",)).fetchone():
+                suffix += 1
+            slug = f"{base}-{suffix}"
+            self._conn.execute(
+                "INSERT OR REPLACE INTO slug_bases (base, next_suffix) VALUES (?, ?)", (base, suffix + 1)
+            )
+        else:
+            slug = base
+
+        self._conn.execute(
+            "INSERT INTO slugs (slug, owner, created_at) VALUES (?, ?, ?)", (slug, owner, time.time())
+        )
+        return slug
+
+    def reserve(self, base: str, owner: Union[str, int, None] = None) -> str:
+        """Returns a unique slug for base (base itself when free) and records it."""
+        return self.reserve_many([base], [owner])[0]
+
+    def reserve_many(self, bases: Sequence[str], owners: Optional[Sequence[Union[str, int, None]]] = None) -> List[str]:
+        owners = owners if owners is not None else [None] * len(bases)
+        with self._lock:
+            # Take the write lock before reading, so workers sharing the file never pick the same slug
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                slugs = [self._reserve(b, str(o) if o is not None else None) for b, o in zip(bases, owners)]
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return slugs
+
+    def add_existing(self, slugs: Iterable[str]) -> None:
+        """Imports slugs that already exist elsewhere (e.g. the posts table) so they are never handed out."""
+        now = time.time()
+        with self._lock:
+            for slug in slugs:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO slugs (slug, owner, created_at) VALUES (?, NULL, ?)", (slug, now)
+                )
+                match = _NUMBERED_SLUG.match(slug)
+                if match:
+                    self._conn.execute(
+                        """
+                        INSERT INTO slug_bases (base, next_suffix) VALUES (?, ?)
+                        ON CONFLICT(base) DO UPDATE SET next_suffix = MAX(next_suffix, excluded.next_suffix)
+                        """,
+                        (match.group(1), int(match.group(2)) + 1),
+                    )
+            self._conn.commit()
+
+    def __contains__(self, slug: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM slugs WHERE slug = ?", (slug,)).fetchone() is not None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
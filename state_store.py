@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+
+from lease_coordinator import shared_store
+
+load_dotenv()
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "scraper_state.db")  # Not used with COORDINATOR=sqlite (see below)
+
+
+class StateStore:
+    """
+    Durable per-channel progress for the scraper, backed by SQLite.
+
+    channel_state:    last Telegram message id that has been fully handled per channel
+    processed_groups: group keys (first message id of a group) already sent through
+                      the pipeline, so a re-fetched group is never paid for twice
+    open_groups:      the not-yet-closed group per channel (see grouper.IncrementalGrouper)
+
+    shared: the file is used by several workers, possibly on other hosts, so it keeps
+            a rollback journal (WAL does not work on network filesystems) and waits
+            for other writers instead of failing
+    """
+    def __init__(self, path: str = STATE_DB_PATH, shared: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30 if shared else 5)
+        if shared:
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS channel_state (
+                channel TEXT PRIMARY KEY,
+                last_message_id INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS processed_groups (
+                channel TEXT NOT NULL,
+                group_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                processed_at REAL NOT NULL,
+                PRIMARY KEY (channel, group_key)
+            );
+            CREATE TABLE IF NOT EXISTS open_groups (
+                channel TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_last_message_id(self, channel: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_message_id FROM channel_state WHERE channel = ?", (channel,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_last_message_id(self, channel: str, message_id: int) -> None:
+        """Advances the checkpoint; never moves it backwards."""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO channel_state (channel, last_message_id, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(channel) DO UPDATE SET
+                    last_message_id = MAX(last_message_id, excluded.last_message_id),
+                    updated_at = excluded.updated_at
+                """,
+                (channel, message_id, time.time()),
+            )
+            self._conn.commit()
+
+    def get_open_group(self, channel: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM open_groups WHERE channel = ?", (channel,)).fetchone()
+        return row[0] if row else None
+
+    def set_open_group(self, channel: str, data: Optional[str]) -> None:
+        with self._lock:
+            if data is None:
+                self._conn.execute("DELETE FROM open_groups WHERE channel = ?", (channel,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO open_groups (channel, data, updated_at) VALUES (?, ?, ?)",
+                    (channel, data, time.time()),
+                )
+            self._conn.commit()
+
+    def is_group_processed(self, channel: str, group_key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed_groups WHERE channel = ? AND group_key = ?",
+                (channel, group_key),
+            ).fetchone()
+        return row is not None
+
+    def processed_group_keys(self, channel: str, group_keys: Iterable[str]) -> set:
+        keys = list(group_keys)
+        if not keys:
+            return set()
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT group_key FROM processed_groups WHERE channel = ? AND group_key IN ({placeholders})",
+                (channel, *keys),
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def mark_group_processed(self, channel: str, group_key: str, status: str = "done") -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO processed_groups (channel, group_key, status, processed_at) VALUES (?, ?, ?, ?)",
+                (channel, group_key, status, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def make_state_store() -> StateStore:
+    """
+    With COORDINATOR=sqlite, channels move between workers, so their progress lives in
+    the shared lease database: the next owner resumes from the last owner's checkpoint,
+    processed groups and open group instead of its own stale copy.
+    """
+    return StateStore(**shared_store(STATE_DB_PATH))
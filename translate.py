@@ -1,11 +1,26 @@
+import asyncio
 import os
+from typing import List, Optional
 from dotenv import load_dotenv
 import re
 import json
-import requests
+
+from gemini import generate_content
+from rate_limiter import PRIORITY_TRANSLATE, estimate_tokens
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')  # Added API Key
+TRANSLATE_CHUNK_TOKENS = int(os.getenv('TRANSLATE_CHUNK_TOKENS', '1500'))  # Estimated input tokens per request
+TRANSLATE_CONCURRENCY = int(os.getenv('TRANSLATE_CONCURRENCY', '4'))  # Chunks of one post translated at once
+TRANSLATE_CHUNK_RETRIES = int(os.getenv('TRANSLATE_CHUNK_RETRIES', '2'))  # Extra tries for a failed/misaligned chunk
+TRANSLATE_CHUNK_TIMEOUT = int(os.getenv('TRANSLATE_CHUNK_TIMEOUT', '60'))
+
+TRANSLATE_SYSTEM_INSTRUCTION = (
+    "You are a precise translator. You will receive a JSON array of strings. "
+    "For each string: If it contains Amharic text, translate it to English. "
+    "If it does NOT contain Amharic (e.g. it is already English), return null. "
+    "Return strictly a JSON array of strings (or nulls) that matches the length and order of the input array."
+)
 
 AMHARIC_PATTERN = re.compile(r'[\u1200-\u137F]')  # Regex to detect Amharic chars
 
@@ -14,7 +29,88 @@ def is_amharic(text):
     return bool(AMHARIC_PATTERN.search(text))
 
 
-def translate_batch_with_gemini(paragraphs):
+def chunk_by_tokens(paragraphs: List[str], indices: List[int], budget: int = TRANSLATE_CHUNK_TOKENS) -> List[List[int]]:
+    """
+    Packs paragraph indices, in order, into chunks whose estimated tokens stay within
+    budget. A paragraph larger than the budget gets a chunk of its own.
+    """
+    chunks, current, used = [], [], 0
+    for i in indices:
+        tokens = estimate_tokens(paragraphs[i])
+        if current and used + tokens > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _translate_chunk(texts: List[str], system_instruction: str, priority: int) -> list:
+    """One request for a chunk; raises if Gemini fails or the answer does not line up with the input."""
+    def same_length(text):
+        try:
+            result = json.loads(text)
+            return isinstance(result, list) and len(result) == len(texts)
+        except (ValueError, TypeError):
+            return False
+
+    generated_text = await generate_content(json.dumps(texts, ensure_ascii=False), system_instruction, is_json=True,
+                                            timeout=TRANSLATE_CHUNK_TIMEOUT, input_label="Input JSON",
+                                            validate=same_length, priority=priority)
+    if not same_length(generated_text):
+        raise ValueError(f"Mismatch: Input {len(texts)} paragraphs, output does not line up")
+    return json.loads(generated_text)
+
+
+async def translate_paragraphs(paragraphs: List[str], system_instruction: str = TRANSLATE_SYSTEM_INSTRUCTION,
+                               budget: int = TRANSLATE_CHUNK_TOKENS, concurrency: int = TRANSLATE_CONCURRENCY,
+                               retries: int = TRANSLATE_CHUNK_RETRIES,
+                               priority: int = PRIORITY_TRANSLATE) -> Optional[list]:
+    """
+    Chunked translation engine. Only paragraphs containing Amharic are sent; they are
+    packed into chunks by token budget and the chunks are translated concurrently, so a
+    long post takes about as long as its slowest chunk.
+
+    A chunk that fails or comes back misaligned is retried on its own, split in half
+    each time so smaller requests line up more reliably. Chunks that succeeded are
+    kept (and cached), so a retry of the whole post only pays for what failed.
+
+    Returns translations in the original order (None for non-Amharic paragraphs), or
+    None if some chunk still failed after its retries.
+    """
+    result = [None] * len(paragraphs)
+    amharic = [i for i, p in enumerate(paragraphs) if is_amharic(p)]
+    if not amharic:
+        return result
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(chunk: List[int], attempts_left: int) -> bool:
+        try:
+            async with semaphore:
+                translated = await _translate_chunk([paragraphs[i] for i in chunk], system_instruction, priority)
+        except Exception as e:
+            if attempts_left <= 0:
+                print(f"  [Translation Failed] Paragraphs {chunk[0]}-{chunk[-1]}: {e}")
+                return False
+            print(f"  [Translation Retry] Paragraphs {chunk[0]}-{chunk[-1]}: {e}")
+            if len(chunk) > 1:
+                mid = len(chunk) // 2
+                halves = await asyncio.gather(run(chunk[:mid], attempts_left - 1), run(chunk[mid:], attempts_left - 1))
+                return all(halves)
+            return await run(chunk, attempts_left - 1)
+
+        for i, text in zip(chunk, translated):
+            result[i] = text
+        return True
+
+    outcomes = await asyncio.gather(*(run(c, retries) for c in chunk_by_tokens(paragraphs, amharic, budget)))
+    return result if all(outcomes) else None
+
+
+async def translate_batch_with_gemini(paragraphs):
     """
     Sends a list of paragraphs to Gemini.
     Returns a list of translated strings (or null/None if original was not Amharic).
@@ -23,47 +119,5 @@ def translate_batch_with_gemini(paragraphs):
         print("  [Warning] GEMINI_API_KEY not found. Skipping translation.")
         return [None] * len(paragraphs)
 
-    # Optimization: If no Amharic in ANY paragraph, skip the API call entirely
-    if not any(is_amharic(p) for p in paragraphs):
-        return [None] * len(paragraphs)
-
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-
-    # We send the data as a JSON string in the prompt to ensure structure
-    prompt_data = json.dumps(paragraphs, ensure_ascii=False)
-
-    system_instruction = (
-        "You are a precise translator. You will receive a JSON array of strings. "
-        "For each string: If it contains Amharic text, translate it to English. "
-        "If it does NOT contain Amharic (e.g. it is already English), return null. "
-        "Return strictly a JSON array of strings (or nulls) that matches the length and order of the input array."
-    )
-
-    payload = {
-        "contents": [{
-            "parts": [{"text": f"{system_instruction}\n\nInput JSON:\n{prompt_data}"}]
-        }],
-        "generationConfig": {
-            "response_mime_type": "application/json"
-        }
-    }
-
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        result = response.json()
-
-        # Parse the JSON text response from Gemini
-        generated_text = result['candidates'][0]['content']['parts'][0]['text']
-        translated_array = json.loads(generated_text)
-
-        if len(translated_array) != len(paragraphs):
-            print(f"  [Translation Error] Mismatch: Input {len(paragraphs)} vs Output {len(translated_array)}")
-            return [None] * len(paragraphs)
-
-        return translated_array
-
-    except Exception as e:
-        print(f"  [Translation Failed] {e}")
-        return [None] * len(paragraphs)
-
+    translated = await translate_paragraphs(paragraphs)
+    return translated if translated is not None else [None] * len(paragraphs)
@@ -1,30 +1,53 @@
+import asyncio
+import multiprocessing
 import os
+import time
 import uuid
-import requests
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from typing import Iterable, Optional
+from typing import BinaryIO, Iterable, List, Optional, Union
 
 from PIL import Image
 
 from dotenv import load_dotenv
 
+from http_client import get_http_client
+from metrics import BYTES_UPLOADED, STAGE_ERRORS, track_stage
+
 load_dotenv()
 
 BUNNY_UPLOAD_ENDPOINT = os.getenv("BUNNY_UPLOAD_ENDPOINT")
 
 IMAGE_EXTS = {"jpg", "jpeg", "png", "gif", "webp"}
 MAX_FILE_SIZE = 10 * 1024 * 1024
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))  # 0 = encode on a thread instead
+# Workers must not be forked from this process: it already runs HTTP threads and holds SQLite connections.
+# The forkserver imports the launching script once (as __mp_main__) and forks workers from that
+# single-threaded process; spawn, the fallback, re-imports it in every worker. Scripts therefore
+# keep sessions and stores out of import time (see main.setup).
+IMAGE_POOL_START_METHOD = os.getenv(
+    "IMAGE_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+_image_pool = None
+
+
+FileData = Union[bytes, bytearray, memoryview, BinaryIO]
 
 
 class UploadProps:
     """
-    file: a file-like object opened in 'rb' with .read()
-          If it doesn't have .filename, pass original_name to upload_file_to_bunny()
+    file: a file-like object opened in 'rb' with .read(), or the raw bytes / memoryview
+          If it doesn't have .filename, pass file_name (or original_name to upload_file_to_bunny())
     table_name: the table you store metadata in (not used here; stub for parity with JS)
     ref_id: foreign key or other reference (not used here; stub for parity with JS)
+    file_name: explicit name for in-memory uploads; its extension decides image vs document
     """
-    def __init__(self, file, table_name: str, ref_id: str, bucket = None, folder = None):
+    def __init__(self, file: FileData, table_name: str, ref_id: str, bucket = None, folder = None,
+                 file_name: Optional[str] = None):
         self.file = file
+        self.file_name = file_name
         self.bucket = bucket
         self.table_name = table_name
         self.ref_id = ref_id
@@ -32,32 +55,132 @@ class UploadProps:
 
 
 class UploadResult:
-    def __init__(self, file_url: str = "", blur_url: str = "", error: str = ""):
+    """
+    variants: remote path per image variant, e.g. {"max": "image/max/<uuid>.jpg", ...}
+    stats: per-variant timing and byte savings from encode_variants (images only)
+    """
+    def __init__(self, file_url: str = "", blur_url: str = "", error: str = "",
+                 variants: Optional[dict] = None, stats: Optional[dict] = None):
         self.file_url = file_url
         self.blur_url = blur_url
         self.error = error
+        self.variants = variants or {}
+        self.stats = stats or {}
 
     def to_dict(self) -> dict:
         return {"fileUrl": self.file_url, "blurUrl": self.blur_url, "error": self.error}
 
 
 
+def _is_buffer(file) -> bool:
+    return isinstance(file, (bytes, bytearray, memoryview))
+
+
+def _file_size(file: FileData) -> int:
+    """Size of a buffer or seekable file without reading it."""
+    if _is_buffer(file):
+        return memoryview(file).nbytes
+    pos = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(pos)
+    return size
+
+
+class MultipartStream:
+    """
+    multipart/form-data body that reads the file part in chunks as it is sent, so a
+    document is never loaded whole or copied into the request. It has a length, so
+    requests sends a Content-Length instead of chunked encoding.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fields: dict, file_field: str, file_name: str, file: FileData,
+                 content_type: str = "application/octet-stream"):
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode("utf-8")
+            for k, v in fields.items()
+        )
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{file_name}"\r\nContent-Type: {content_type}\r\n\r\n').encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        if _is_buffer(file):
+            file = memoryview(file).cast("B")
+            self.file_size = file.nbytes
+        else:
+            self.file_size = _file_size(file) - file.tell()
+        self._parts = [memoryview(head), file, memoryview(tail)]
+        self._length = len(head) + self.file_size + len(tail)
+        self._part = 0
+        self._offset = 0  # Position inside the current buffer part
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        size = self.CHUNK_SIZE if size is None or size < 0 else size
+        while self._part < len(self._parts):
+            part = self._parts[self._part]
+            if isinstance(part, memoryview):
+                chunk = bytes(part[self._offset:self._offset + size])
+                self._offset += len(chunk)
+            else:
+                chunk = part.read(size)
+            if chunk:
+                return chunk
+            self._part += 1
+            self._offset = 0
+        return b""
+
+
 def _infer_extension(filename: str) -> str:
     return (filename.rsplit(".", 1)[-1] if "." in filename else "").lower()
 
 
-def _save_compressed(img: Image.Image, extension: str) -> bytes:
+class ImageVariant:
     """
-    Compress image while preserving the file format where sensible.
+    One rung of the image size ladder.
+    max_side: longest side in px (0 = keep the original size)
+    fmt: output format for this variant only (e.g. "jpeg"); None follows the upload's extension
+    """
+    def __init__(self, name: str, max_side: int, quality: int, fmt: Optional[str] = None):
+        self.name = name
+        self.max_side = max_side
+        self.quality = quality
+        self.fmt = fmt
+
+
+def parse_variant_ladder(spec: str) -> List[ImageVariant]:
+    """Parses "name:max_side:quality[:format],..." e.g. "max:0:70,medium:1280:75,blur:20:10:jpeg"."""
+    ladder = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        fields = item.split(":")
+        ladder.append(ImageVariant(fields[0], int(fields[1]), int(fields[2]), fields[3].lower() if len(fields) > 3 else None))
+    return ladder
+
+
+# Defaults reproduce the original two uploads: recompressed original + 20px JPEG placeholder
+IMAGE_VARIANTS = parse_variant_ladder(os.getenv("IMAGE_VARIANTS", "max:0:70,blur:20:10:jpeg"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "").lower()  # e.g. "webp"; empty keeps the source format
+
+FORMAT_MAP = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP", "gif": "GIF"}
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    """
+    Compress image in the given Pillow format.
     JPEG/WEBP -> use quality; PNG -> optimize; GIF -> leave as is.
     """
     out = BytesIO()
-    fmt_map = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "webp": "WEBP", "gif": "GIF"}
-    fmt = fmt_map.get(extension, "JPEG")
-
     save_kwargs = {}
     if fmt in ("JPEG", "WEBP"):
-        save_kwargs["quality"] = 70
+        save_kwargs["quality"] = quality
         save_kwargs["optimize"] = True
     elif fmt == "PNG":
         save_kwargs["optimize"] = True
@@ -66,56 +189,125 @@ def _save_compressed(img: Image.Image, extension: str) -> bytes:
     return out.getvalue()
 
 
-def create_blurred_version(file_bytes: bytes) -> bytes:
+def _save_compressed(img: Image.Image, extension: str) -> bytes:
     """
-    Create a very small blur/placeholder (~20px longest side) as JPEG (tiny).
+    Compress image while preserving the file format where sensible.
+    """
+    return _encode(img, FORMAT_MAP.get(extension, "JPEG"), 70)
+
+
+def _downscale(img: Image.Image, max_side: int) -> Image.Image:
+    """
+    Shrinks so the longest side is max_side. Large factors go through Image.reduce
+    (cheap box filter) first and only the last <2x step uses LANCZOS.
+    """
+    if not max_side or max(img.size) <= max_side:
+        return img
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode == "PA" else "RGB")
+
+    factor = max(img.size) // (max_side * 2)
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    scale = max_side / max(img.width, img.height)
+    return img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.Resampling.LANCZOS)
+
+
+def encode_variants(file_bytes: bytes, extension: str, ladder: List[ImageVariant]):
     """
+    Decodes the image once and emits every variant of the ladder from that single bitmap,
+    largest first, each derived from the previous one. JPEG sources whose ladder has no
+    full-size rung are decoded in draft mode straight at the reduced scale.
+    Returns ([(variant_name, bytes)], stats). Module-level so it can run in the image process pool.
+    """
+    t0 = time.perf_counter()
     try:
         img = Image.open(BytesIO(file_bytes))
     except Exception as e:
         raise ValueError(f"Failed to load image: {e}")
 
-    max_side = 20
-    scale = max_side / max(img.width, img.height)
-    new_w = max(1, int(img.width * scale))
-    new_h = max(1, int(img.height * scale))
+    largest = max((v.max_side for v in ladder), default=0)
+    if img.format == "JPEG" and all(v.max_side > 0 for v in ladder):
+        img.draft("RGB", (largest, largest))
+    img.load()
+
+    source_bytes = len(file_bytes)
+    stats = {"source_bytes": source_bytes, "decode_ms": round((time.perf_counter() - t0) * 1000, 2), "variants": {}}
+
+    outputs = []
+    current = img
+    for v in sorted(ladder, key=lambda v: v.max_side or float("inf"), reverse=True):
+        t = time.perf_counter()
+        current = _downscale(current, v.max_side)
+        fmt = FORMAT_MAP.get(v.fmt or extension, "JPEG")
+        data = _encode(current, fmt, v.quality)
+        outputs.append((v.name, data))
+        stats["variants"][v.name] = {
+            "ms": round((time.perf_counter() - t) * 1000, 2),
+            "bytes": len(data),
+            "size": current.size,
+            "saved_pct": round(100 * (1 - len(data) / source_bytes), 1) if source_bytes else 0.0,
+        }
+    stats["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return outputs, stats
 
-    img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
 
-    out = BytesIO()
-    img.convert("RGB").save(out, format="JPEG", quality=10, optimize=True)
-    return out.getvalue()
+def create_blurred_version(file_bytes: bytes) -> bytes:
+    """
+    Create a very small blur/placeholder (~20px longest side) as JPEG (tiny).
+    """
+    outputs, _ = encode_variants(file_bytes, "jpeg", [ImageVariant("blur", 20, 10, "jpeg")])
+    return outputs[0][1]
+
+
+def _get_image_pool():
+    global _image_pool
+    if _image_pool is None and IMAGE_WORKERS > 0:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS,
+                                          mp_context=multiprocessing.get_context(IMAGE_POOL_START_METHOD))
+    return _image_pool
 
 
-def upload_to_bunny(file_bytes: bytes, path: str, original_name: Optional[str] = None) -> bool:
+async def encode_variants_async(file_bytes: FileData, extension: str, ladder: List[ImageVariant]):
+    """Runs encode_variants off the event loop (process pool, or the default thread pool if IMAGE_WORKERS=0)."""
+    loop = asyncio.get_running_loop()
+    pool = _get_image_pool()
+    if pool is not None and not isinstance(file_bytes, bytes):
+        file_bytes = bytes(file_bytes)  # memoryviews cannot be pickled to a worker process
+    return await loop.run_in_executor(pool, encode_variants, file_bytes, extension, ladder)
+
+
+async def upload_to_bunny(file_bytes: FileData, path: str, original_name: Optional[str] = None) -> bool:
     """
     Posts to your Next.js route with BOTH:
-      - multipart 'file' (bytes)
+      - multipart 'file' (bytes, memoryview or a readable file object, streamed from its current position)
       - form field 'filename' (the remote Bunny path)
     """
-    files = {
-        "file": (original_name or "upload.bin", file_bytes, "application/octet-stream"),
-    }
-    data = {"filename": path}
-
-    res = requests.post(BUNNY_UPLOAD_ENDPOINT, files=files, data=data, timeout=60)
+    body = MultipartStream({"filename": path}, "file", original_name or "upload.bin", file_bytes)
+    res = await get_http_client().post(BUNNY_UPLOAD_ENDPOINT, data=body,
+                                       headers={"Content-Type": body.content_type}, timeout=60)
+    if res.ok:
+        BYTES_UPLOADED.inc(body.file_size)
     return res.ok
 
 
 
-def upload_file_to_bunny(props: UploadProps, original_name: Optional[str] = None) -> UploadResult:
+async def upload_file_to_bunny(props: UploadProps, original_name: Optional[str] = None) -> UploadResult:
     """
     Mirrors your JS behavior:
       - Generates uuid
-      - If image: compress + blur; upload two variants under image/max and image/blur
+      - If image: decode once in the image pool and upload every IMAGE_VARIANTS rung
+        (by default max + blur) under image/<variant>/ in parallel
       - If non-image: upload to document/
       - Enforces 10MB limit for non-images (images are recompressed)
+    Accepts in-memory buffers as well as files; documents are checked by size (seeking,
+    not reading) and streamed to Bunny in chunks by MultipartStream.
     Returns UploadResult(file_url="<uuid>.<ext>", blur_url="", error="")
     """
-    file_bytes = props.file.read()
-
     file_name = (
         original_name
+        or props.file_name
         or getattr(props.file, "filename", None)
         or getattr(props.file, "name", None)
         or "upload.bin"
@@ -132,30 +324,36 @@ def upload_file_to_bunny(props: UploadProps, original_name: Optional[str] = None
 
     if is_image:
         try:
-            img = Image.open(BytesIO(file_bytes))
-            compressed_bytes = _save_compressed(img, extension)
-            blur_bytes = create_blurred_version(file_bytes)
-
-            max_path = f"image/max/{uid}.{extension or 'jpg'}"
-            blur_path = f"image/blur/{uid}.{extension or 'jpg'}"
-
-            ok1 = upload_to_bunny(compressed_bytes, max_path, original_name=f"{uid}.{extension or 'jpg'}")
-            ok2 = upload_to_bunny(blur_bytes, blur_path, original_name=f"{uid}.{extension or 'jpg'}")
-
-            if not (ok1 and ok2):
+            file_bytes = props.file if _is_buffer(props.file) else props.file.read()
+            out_ext = IMAGE_OUTPUT_FORMAT or extension or 'jpg'
+            with track_stage("encode"):
+                outputs, stats = await encode_variants_async(file_bytes, out_ext, IMAGE_VARIANTS)
+
+            # Every variant shares one file name; the folder (image/<variant>/) tells them apart
+            name = f"{uid}.{out_ext}"
+            paths = {variant: f"image/{variant}/{name}" for variant, _ in outputs}
+            with track_stage("upload"):
+                results = await asyncio.gather(
+                    *(upload_to_bunny(data, paths[variant], original_name=name) for variant, data in outputs)
+                )
+
+            if not all(results):
+                STAGE_ERRORS.inc(stage="upload")
                 return UploadResult(error="Upload failed")
 
-            return UploadResult(file_url=f"{uid}.{extension or 'jpg'}", blur_url="", error="")
+            return UploadResult(file_url=name, blur_url="", error="", variants=paths, stats=stats)
 
         except Exception as e:
             return UploadResult(error=f"Image processing failed: {e}")
 
-    if len(file_bytes) > MAX_FILE_SIZE:
+    if _file_size(props.file) > MAX_FILE_SIZE:
         return UploadResult(error="File exceeds 10MB limit")
 
     doc_path = f"document/{uid}.{extension or 'bin'}"
-    ok = upload_to_bunny(file_bytes, doc_path, original_name=f"{uid}.{extension or 'bin'}")
+    with track_stage("upload"):
+        ok = await upload_to_bunny(props.file, doc_path, original_name=f"{uid}.{extension or 'bin'}")
     if not ok:
+        STAGE_ERRORS.inc(stage="upload")
         return UploadResult(error="Upload failed")
 
     return UploadResult(file_url=f"{uid}.{extension or 'bin'}", blur_url="", error="")
@@ -168,7 +366,7 @@ if __name__ == "__main__":
         with open(test_path, "rb") as f:
             f.filename = os.path.basename(test_path)
             props = UploadProps(file=f, table_name="images", ref_id="123")
-            res = upload_file_to_bunny(props)
+            res = asyncio.run(upload_file_to_bunny(props))
             print(res.to_dict())
     else:
         print("Example skipped: downloads/myphoto.jpg not found.")
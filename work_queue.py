@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", "work_queue.db")  # Not used with COORDINATOR=sqlite
+LEASE_SECONDS = 600  # A claimed job is handed out again if its worker has not finished by then
+IDLE_SLEEP_SECONDS = float(os.getenv("WORK_QUEUE_IDLE_SECONDS", "2"))  # Pause between polls of an empty stage
+
+# Pipeline order; "done", "skipped" and "failed" are terminal
+STAGES = ("enrich", "media", "publish")
+TERMINAL_STAGES = ("done", "skipped", "failed")
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempts: int) -> float:
+        return min(self.max_delay, self.base_delay * (2 ** (attempts - 1))) * random.uniform(0.5, 1.0)
+
+
+DEFAULT_POLICIES: Dict[str, RetryPolicy] = {
+    "enrich": RetryPolicy(max_attempts=8, base_delay=30, max_delay=1800),
+    "media": RetryPolicy(max_attempts=5, base_delay=30, max_delay=900),
+    "publish": RetryPolicy(max_attempts=10, base_delay=15, max_delay=3600),
+}
+
+
+class Job:
+    """
+    key: idempotency key (the post id), so re-enqueueing the same group is a no-op
+    attempts: failed attempts at the current stage
+    data: everything later stages need; each stage adds its results to it
+    """
+    def __init__(self, key: str, channel: str, stage: str, data: dict, attempts: int):
+        self.key = key
+        self.channel = channel
+        self.stage = stage
+        self.data = data
+        self.attempts = attempts
+
+
+class WorkQueue:
+    """
+    Durable SQLite-backed queue that moves each post through explicit stages.
+
+    Every stage result is committed before the next stage starts, so a failure (or a
+    restart) only repeats the stage that did not complete. Work in flight when the
+    process stopped is picked up again once its lease expires, or immediately after
+    release_leases() at startup.
+
+    shared: several workers, possibly on other hosts, use the file, so it keeps a
+            rollback journal (WAL does not work on network filesystems)
+    """
+    def __init__(self, path: str = WORK_QUEUE_PATH, policies: Optional[Dict[str, RetryPolicy]] = None,
+                 worker_id: str = "", shared: bool = False):
+        self.path = path
+        self.policies = policies or DEFAULT_POLICIES
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if shared:
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_key TEXT PRIMARY KEY,
+                channel TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                leased_until REAL NOT NULL DEFAULT 0,
+                leased_by TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (stage, next_attempt_at);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "leased_by" not in columns:  # Queues created before jobs were shared between workers
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN leased_by TEXT")
+        self._conn.commit()
+
+    def enqueue(self, key: str, channel: str, data: dict, stage: str = STAGES[0]) -> bool:
+        """Adds a job; returns False if a job with this key already exists."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                INSERT OR IGNORE INTO jobs (job_key, channel, stage, data, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, channel, stage, json.dumps(data, ensure_ascii=False), now, now, now),
+            )
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def claim(self, stage: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS) -> List[Job]:
+        """Leases up to `limit` jobs that are ready for `stage`."""
+        now = time.time()
+        with self._lock:
+            # Take the write lock before reading, so workers in other processes never claim the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                """
+                SELECT job_key, channel, stage, data, attempts FROM jobs
+                WHERE stage = ? AND next_attempt_at <= ? AND leased_until < ?
+                ORDER BY next_attempt_at LIMIT ?
+                """,
+                (stage, now, now, limit),
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE jobs SET leased_until = ?, leased_by = ? WHERE job_key = ?",
+                    [(now + lease_seconds, self.worker_id, r[0]) for r in rows],
+                )
+            self._conn.commit()
+        return [Job(key, channel, st, json.loads(data), attempts) for key, channel, st, data, attempts in rows]
+
+    def advance(self, job: Job, next_stage: str, data: Optional[dict] = None) -> None:
+        """Commits a stage result and hands the job to `next_stage` (or a terminal stage)."""
+        if data is not None:
+            job.data = data
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE jobs SET stage = ?, data = ?, attempts = 0, next_attempt_at = ?, leased_until = 0,
+                    last_error = NULL, updated_at = ?
+                WHERE job_key = ?
+                """,
+                (next_stage, json.dumps(job.data, ensure_ascii=False), now, now, job.key),
+            )
+            self._conn.commit()
+        job.stage = next_stage
+        job.attempts = 0
+
+    def save_progress(self, job: Job, data: dict) -> None:
+        """Commits partial results of the current stage, so a retry can skip what already succeeded."""
+        job.data = data
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE job_key = ?",
+                (json.dumps(data, ensure_ascii=False), time.time(), job.key),
+            )
+            self._conn.commit()
+
+    def retry(self, job: Job, error: str) -> Optional[float]:
+        """
+        Schedules the current stage again per its RetryPolicy.
+        Returns the delay, or None once max_attempts is reached and the job is marked failed.
+        """
+        policy = self.policies[job.stage]
+        attempts = job.attempts + 1
+        now = time.time()
+        if attempts >= policy.max_attempts:
+            with self._lock:
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET stage = 'failed', attempts = ?, leased_until = 0, last_error = ?, updated_at = ?
+                    WHERE job_key = ?
+                    """,
+                    (attempts, f"{job.stage}: {error}", now, job.key),
+                )
+                self._conn.commit()
+            return None
+
+        delay = policy.delay(attempts)
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE jobs SET attempts = ?, next_attempt_at = ?, leased_until = 0, last_error = ?, updated_at = ?
+                WHERE job_key = ?
+                """,
+                (attempts, now + delay, error, now, job.key),
+            )
+            self._conn.commit()
+        return delay
+
+    def is_last_attempt(self, job: Job) -> bool:
+        return job.attempts + 1 >= self.policies[job.stage].max_attempts
+
+    def release_leases(self, all_workers: bool = False) -> None:
+        """
+        Makes jobs leased by a previous run of this worker claimable right away. Leases of
+        other workers sharing the queue are left to expire, unless all_workers is set
+        because nobody else uses the queue.
+        """
+        with self._lock:
+            if all_workers:
+                self._conn.execute("UPDATE jobs SET leased_until = 0 WHERE leased_until > 0")
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET leased_until = 0 WHERE leased_until > 0 AND COALESCE(leased_by, '') = ?",
+                    (self.worker_id,),
+                )
+            self._conn.commit()
+
+    def pending(self) -> int:
+        """Jobs not yet in a terminal stage."""
+        placeholders = ",".join("?" * len(TERMINAL_STAGES))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE stage NOT IN ({placeholders})", TERMINAL_STAGES
+            ).fetchone()
+        return row[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# A stage handler receives the claimed jobs and returns, per job and in order, either
+# (next_stage, data) to advance it or an Exception to retry the stage.
+StageHandler = Callable[[List[Job]], Awaitable[list]]
+
+
+async def run_stage_workers(queue: WorkQueue, stage: str, handler: StageHandler, workers: int = 1,
+                            batch_size: int = 1, idle_sleep: float = IDLE_SLEEP_SECONDS) -> None:
+    """Runs `workers` concurrent loops that claim ready jobs for `stage` and apply the handler's outcomes."""
+
+    async def worker():
+        while True:
+            jobs = queue.claim(stage, limit=batch_size)
+            if not jobs:
+                await asyncio.sleep(idle_sleep)
+                continue
+            try:
+                outcomes = await handler(jobs)
+            except Exception as e:
+                outcomes = [e] * len(jobs)
+
+            for job, outcome in zip(jobs, outcomes):
+                if isinstance(outcome, Exception):
+                    delay = queue.retry(job, str(outcome))
+                    if delay is None:
+                        print(f"    [FAILED] {job.key} gave up at {stage}: {outcome}")
+                    else:
+                        print(f"    [RETRY] {job.key} {stage} in {int(delay)}s: {outcome}")
+                else:
+                    next_stage, data = outcome
+                    queue.advance(job, next_stage, data)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))